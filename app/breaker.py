@@ -0,0 +1,78 @@
+import time
+from typing import Optional
+
+
+class EndpointUnavailable(Exception):
+    """GraphDB failed, missed the query deadline, or is cut off by the
+    circuit breaker."""
+    pass
+
+
+class QueueTimeout(EndpointUnavailable):
+    """Every query slot stayed busy for too long. The endpoint may well
+    be fine, so this is not counted against the circuit breaker."""
+    pass
+
+
+class CircuitBreaker():
+    """Stop calling an endpoint after `threshold` consecutive failures.
+
+    While open, calls are refused at once instead of waiting on a stalled
+    endpoint. After `reset_after` seconds one trial call is let through;
+    its success closes the breaker, its failure opens it again.
+    """
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self.opened_at < self.reset_after:
+            return "open"
+        return "half-open"
+
+    def retry_in(self) -> float:
+        """Seconds until a trial call will be let through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            self._trial = True
+        return state != "open"
+
+    def abandon(self) -> None:
+        """End the trial call when it neither succeeded nor failed, for
+        instance because its caller went away: it counts as a failure,
+        so another trial follows after `reset_after` instead of the
+        breaker staying open for good."""
+        if self._trial:
+            self.failure()
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self) -> dict:
+        return { "state": self.state,
+                 "failures": self.failures,
+                 "trips": self.trips,
+                 "threshold": self.threshold,
+                 "reset_after": self.reset_after }
@@ -0,0 +1,64 @@
+import json
+import re
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+# result format -> Accept header sent to the endpoint
+ACCEPT = { "json": "application/sparql-results+json",
+           "tsv": "text/tab-separated-values" }
+
+ESCAPES = { 't': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f',
+            '"': '"', "'": "'", '\\': '\\' }
+
+escape = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+
+def unescape_match(match: re.Match) -> str:
+    code = match.group(1) or match.group(2)
+    if code:
+        return chr(int(code, 16))
+    return ESCAPES.get(match.group(3), match.group(3))
+
+
+def decode_json(content: bytes) -> list[dict]:
+    """The rows of a SPARQL JSON result, as {variable: value} dicts."""
+    return [{k: v['value'] for k, v in binding.items()}
+            for binding in loads(content)['results']['bindings']]
+
+
+def tsv_value(term: str):
+    """The lexical value of an RDF term as written in SPARQL TSV."""
+    if not term:
+        return None
+    first = term[0]
+    if first == '<':
+        return term[1:-1]
+    if first == '"' or first == "'":
+        # the closing quote comes before any @lang or ^^<datatype>
+        value = term[1:term.rfind(first)]
+        return escape.sub(unescape_match, value) if '\\' in value else value
+    if term.startswith('_:'):
+        return term[2:]
+    # numbers and booleans are written bare
+    return term
+
+
+def decode_tsv(text: str) -> list[dict]:
+    """The rows of a SPARQL TSV result; unbound cells are left out."""
+    lines = text.split('\n')
+    header = [name.lstrip('?$') for name in lines[0].rstrip('\r').split('\t')]
+    rows = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        # plain literals and IRIs are sliced inline; anything with a
+        # language, datatype or escape goes through tsv_value
+        rows.append({name: term[1:-1] if (term[0] == '<' or term[-1] == '"') and '\\' not in term
+                           else tsv_value(term)
+                     for name, term in zip(header, line.rstrip('\r').split('\t')) if term})
+    return rows
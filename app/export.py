@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+from app.kb import SEPARATOR, TRANSLATOR_LISTS
+
+
+TRANSLATION_COLUMNS = ("translation", "title", "translator", "translator_name",
+                       "author", "author_name", "original", "olang", "olangLabel",
+                       "tlang", "tlangLabel", "genre", "magazine", "magazine_id",
+                       "magazine_label", "issue", "issue_id", "issue_label",
+                       "pubDate", "volume", "number")
+
+TRANSLATOR_COLUMNS = ("id", "label", "gender", "birthDate", "deathDate",
+                      *TRANSLATOR_LISTS)
+
+MEDIA_TYPES = { "csv": "text/csv",
+                "ndjson": "application/x-ndjson" }
+
+# rows are sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+async def csv_chunks(rows: AsyncIterator[dict], columns: tuple) -> AsyncIterator[str]:
+    """Write `rows` as CSV under a header of `columns`; list values are
+    joined with SEPARATOR as in the translators query."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([SEPARATOR.join(value) if isinstance(value, list) else value
+                         for value in (row.get(column) for column in columns)])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def ndjson_chunks(rows: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Write `rows` as newline-delimited JSON, one object per row."""
+    lines = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(row, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+            size = 0
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_chunks(rows: AsyncIterator[dict], format: str, columns: tuple) -> AsyncIterator[str]:
+    if format == "csv":
+        return csv_chunks(rows, columns)
+    if format == "ndjson":
+        return ndjson_chunks(rows)
+    raise ValueError(f"unknown export format {format}")
@@ -0,0 +1,86 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from app import timing
+from app.kb import Kb
+
+
+class ResponseCache(BaseHTTPMiddleware):
+    """Cache GET responses per route, parameters and graph version.
+
+    A page under one of `prefixes` only depends on its URL and the graph,
+    so it is stored under those and the Kb's graph version token, for at
+    most `ttl` seconds: a reload that leaves the version unchanged is
+    picked up once the entry expires. The ETag is a hash of the body, so
+    a matching If-None-Match is answered with 304 only while the body is
+    the same, and a stored page is answered without touching GraphDB or
+    Jinja.
+    """
+    def __init__(self, app, kb: Kb, prefixes: tuple[str, ...],
+                 exclude: tuple[str, ...] = (),
+                 maxsize: int = 512, max_age: int = 60, ttl: float = 300.0) -> None:
+        super().__init__(app)
+        self.kb = kb
+        self.prefixes = prefixes
+        self.exclude = exclude
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.ttl = ttl
+        # key -> (etag, body, media type, time stored)
+        self._entries: OrderedDict = OrderedDict()
+
+    def cacheable(self, request: Request) -> bool:
+        path = request.url.path
+        return (request.method == "GET"
+                and path.startswith(self.prefixes)
+                and not path.startswith(self.exclude))
+
+    def key(self, request: Request, version: str) -> str:
+        params = sorted(request.query_params.multi_items())
+        return f"{version}\n{request.url.path}\n{params}"
+
+    def etag(self, body: bytes) -> str:
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def headers(self, etag: str) -> dict:
+        return { "ETag": etag,
+                 "Cache-Control": f"public, max-age={self.max_age}" }
+
+    def answer(self, request: Request, etag: str, body: bytes,
+               media_type: Optional[str]) -> Response:
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=self.headers(etag))
+        return Response(body, media_type=media_type, headers=self.headers(etag))
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if not self.cacheable(request):
+            return await call_next(request)
+
+        version: Optional[str] = await self.kb.graph_version()
+        if version is None:
+            return await call_next(request)
+
+        key = self.key(request, version)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[3] < self.ttl:
+            self._entries.move_to_end(key)
+            etag, body, media_type, _ = entry
+            return self.answer(request, etag, body, media_type)
+        self._entries.pop(key, None)
+
+        response = await call_next(request)
+        if (response.status_code != 200 or "set-cookie" in response.headers
+                or timing.is_stale()):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        media_type = response.headers.get("content-type")
+        etag = self.etag(body)
+        self._entries[key] = (etag, body, media_type, time.monotonic())
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return self.answer(request, etag, body, media_type)
@@ -1,25 +1,874 @@
-from SPARQLWrapper import SPARQLWrapper2
-from pydantic import BaseModel
+import asyncio
+import base64
+import csv
+import json
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from threading import Lock
+from typing import AsyncIterator, Optional
+import httpx
+from pydantic import BaseModel, PrivateAttr
+from app import timing
+from app.breaker import CircuitBreaker, EndpointUnavailable, QueueTimeout
+from app.decode import ACCEPT, decode_json, decode_tsv
+from app.metrics import QueryMetrics
+from app.search import NameIndex, SearchIndex
+from app.stats import StatsCube
+from app.sparql import bind, literal, values_block
+from app.table import TranslationTable
 
 class QueryResult(BaseModel):
     count: int
     data: list[dict]
+    cursor: Optional[str] = None
+    # serialized JSON, kept by app.responses for reuse
+    _json: Optional[bytes] = PrivateAttr(default=None)
+
+
+TRANSLATION_PREFIXES = """PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
+PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX dcterms: <http://purl.org/dc/terms/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+"""
+
+TRANSLATION_FILTERS = ("sl", "tl", "genre", "after_date", "before_date",
+                       "language_area", "magazine")
+
+# Filter name -> the variable its value is bound to in the VALUES block,
+# and the kind of term. Equality filters bind the pattern variable itself;
+# the others bind a ?_ parameter that the patterns compare against.
+TRANSLATION_PARAMS = { "sl": ("?olang", "iri"),
+                       "tl": ("?tlang", "iri"),
+                       "genre": ("?genre", "literal"),
+                       "after_date": ("?_after_date", "integer"),
+                       "before_date": ("?_before_date", "integer"),
+                       "language_area": ("?_language_area", "literal"),
+                       "magazine": ("?magazine", "iri") }
+
+# The columns of a translation row; also the keys it may be sorted by.
+TRANSLATION_VARIABLES = ("?original", "?translation", "?author", "?translator",
+                         "?olang", "?tlang", "?genre", "?issue", "?pubDate",
+                         "?number", "?volume", "?magazine", "?title",
+                         "?issue_label", "?issue_id", "?magazine_label",
+                         "?magazine_id", "?author_name", "?translator_name",
+                         "?olangLabel", "?tlangLabel")
+
+# Keyset order of translation rows. The rows are DISTINCT over every
+# projected variable, so all of them are in the key: a translation with
+# two genres or originals gives rows that would otherwise tie, and the
+# seek would skip those falling past a page boundary.
+TRANSLATION_ORDER = ["?magazine_id", "?pubDate", "?translation",
+                     "?translator", "?author", "?title"]
+TRANSLATION_ORDER += [var for var in TRANSLATION_VARIABLES if var not in TRANSLATION_ORDER]
+
+
+def sort_key(var: str) -> str:
+    """The sort expression of a key; an unbound value, such as a missing
+    ?volume, sorts and compares as the empty string."""
+    return f'COALESCE(STR({var}), "")'
+
+
+def encode_cursor(sortby: Optional[str], values: list) -> str:
+    payload = json.dumps({"s": sortby or "", "k": values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sortby: Optional[str]) -> list:
+    """Return the sort key values of a cursor, or raise ValueError if it
+    does not belong to this ordering."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload['k']
+        same_order = payload['s'] == (sortby or "")
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+    if not same_order or not isinstance(values, list):
+        raise ValueError(f"invalid cursor: {cursor}")
+    return values
+
+
+def seek_filter(keys: tuple) -> str:
+    """A FILTER that keeps the rows sorting after the cursor values,
+    which are bound to ?_seek0, ?_seek1, ... in the VALUES block."""
+    # k0 > s0 || (k0 = s0 && k1 > s1) || ..., spelled out flat rather
+    # than nested, which some parsers cannot take twenty keys deep
+    terms = []
+    for i, key in enumerate(keys):
+        equal = [f"{sort_key(keys[j])} = ?_seek{j}" for j in range(i)]
+        terms.append("(" + " && ".join(equal + [f"{sort_key(key)} > ?_seek{i}"]) + ")")
+    return "FILTER(" + "\n       || ".join(terms) + ")\n"
+
+
+def seek_bindings(keys: list[str], values: list) -> list[tuple[str, str]]:
+    if len(keys) != len(values):
+        raise ValueError("cursor does not match the sort keys")
+    return [(f"?_seek{i}", literal(value)) for i, value in enumerate(values)]
+
+
+def active_filters(kwargs: dict, names) -> tuple:
+    """The names of the filters in `kwargs` that restrict the results."""
+    return tuple(name for name in names if kwargs.get(name) not in (None, '', 'any'))
+
+
+def paging(kwargs: dict) -> str:
+    q = ""
+    if kwargs.get("offset"):
+        q += f"OFFSET {int(kwargs['offset'])} "
+    if kwargs.get("limit"):
+        q += f"LIMIT {int(kwargs['limit'])} "
+    return q
+
+
+class FacetCache():
+    """A bounded TTL cache for results that only change when the graph is
+    reloaded, such as the vocabularies that fill the filter dropdowns.
+
+    Entries are kept for `ttl` seconds; `purge` drops them immediately
+    after a reload.
+    """
+    def __init__(self, ttl: float = 300, maxsize: int = 128) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def purge(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def stats(self) -> dict:
+        return { "ttl": self.ttl,
+                 "maxsize": self.maxsize,
+                 "size": len(self._entries),
+                 "hits": self.hits,
+                 "misses": self.misses }
+
+
+facet_cache = FacetCache()
+
+
+def facet(method):
+    """Memoize a vocabulary query in the Kb's facet cache, per endpoint."""
+    @wraps(method)
+    async def wrapper(self):
+        key = (self.endpoint, method.__name__)
+        result = self.facet_cache.get(key)
+        if result is None:
+            result = await method(self)
+            self.facet_cache.set(key, result)
+        return result
+    return wrapper
+
+
+# Each facet vocabulary as a UNION branch of Kb.facets(): the columns
+# ?value, ?label and ?key are renamed to the row keys used by the
+# individual vocabulary methods.
+FACETS = {
+    "languages": (("lang", "label", "key"), """?value a crm:E56_Language ;
+               rdfs:label ?label ;
+               dcterms:identifier ?key ."""),
+    "source_languages": (("lang", "label", "key"), """?original lrm:R68_is_inspiration_for ?translation .
+        ?original lrm:R3i_is_realised_by / crm:P72_has_language ?value .
+        ?value rdfs:label ?label ;
+               dcterms:identifier ?key ."""),
+    "target_languages": (("lang", "label", "key"), """?original lrm:R68_is_inspiration_for ?translation .
+        ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?value .
+        ?value rdfs:label ?label ;
+               dcterms:identifier ?key ."""),
+    "magazines": (("magazine", "label", "key"), """?type dcterms:identifier "journal" .
+        ?value a lrm:F18_Serial_Work ;
+               lrm:P2_has_type ?type ;
+               dcterms:identifier ?key ;
+               rdfs:label ?label ."""),
+    "dates": (("date",), """?issuetype a crm:E55_Type ;
+                   dcterms:identifier "issue" .
+        ?issue lrm:P2_has_type ?issuetype ;
+               spatrem:pubDate ?value ."""),
+    "year_births": (("date",), "?s spatrem:year_birth ?value ."),
+    "year_deaths": (("date",), "?s spatrem:year_death ?value ."),
+    "genres": (("genre",), "?s spatrem:genre ?value ."),
+    "genders": (("gender",), "?s spatrem:gender ?value ."),
+    "nationalities": (("nationality",), "?s spatrem:nationality ?value ."),
+    "language_areas": (("language_area",), "?s spatrem:language_area ?value ."),
+}
+
+
+TRANSLATOR_PREFIXES = """PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX dcterms: <http://purl.org/dc/terms/>
+PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
+"""
+
+# translator dict key -> variable folded into it by GROUP_CONCAT
+TRANSLATOR_LISTS = { "nationalities": "?nationality",
+                     "language_areas": "?language_area",
+                     "source_langs": "?olangLabel",
+                     "target_langs": "?tlangLabel",
+                     "genres": "?genre",
+                     "magazines": "?magLabel" }
+
+SEPARATOR = "|"
+
+TRANSLATOR_FILTERS = ("sl", "tl", "genre", "magazine", "gender", "nationality",
+                      "language_area", "year_birth", "year_death")
+
+# as TRANSLATION_PARAMS, for the translator queries
+TRANSLATOR_PARAMS = { "sl": ("?olang", "iri"),
+                      "tl": ("?tlang", "iri"),
+                      "genre": ("?genre", "literal"),
+                      "magazine": ("?magazine", "iri"),
+                      "gender": ("?gender", "literal"),
+                      "nationality": ("?nationality", "literal"),
+                      "language_area": ("?language_area", "literal"),
+                      "year_birth": ("?_year_birth", "literal"),
+                      "year_death": ("?_year_death", "literal") }
+
+TRANSLATOR_SORT_KEYS = ("?label", "?gender", "?nationality", "?language_area",
+                        "?year_birth", "?year_death", "?genre", "?olangLabel",
+                        "?tlangLabel", "?magLabel")
+
+# filter name -> the variable whose values its dropdown counts
+TRANSLATION_FACETS = { "sl": "?olang",
+                       "tl": "?tlang",
+                       "genre": "?genre",
+                       "magazine": "?magazine",
+                       "language_area": "?language_area" }
+
+TRANSLATOR_FACETS = { "sl": "?olang",
+                      "tl": "?tlang",
+                      "genre": "?genre",
+                      "magazine": "?magazine",
+                      "gender": "?gender",
+                      "nationality": "?nationality",
+                      "language_area": "?language_area" }
+
+# larger results, such as the materialized table, are not kept for
+# serving stale
+STALE_MAX_ROWS = 10000
+
+# compiled query templates kept per filter shape
+TEMPLATE_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def translation_patterns(active: tuple) -> str:
+    """The body of the WHERE clause shared by the translation row and
+    count queries, for the filters named in `active`. Their values are
+    bound separately, in a VALUES block."""
+    q: str = """	?original lrm:R68_is_inspiration_for ?translation .
+    ?original lrm:R16i_was_created_by / crm:P14_carried_out_by ?author .
+    ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by ?translator .
+    ?original lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
+    ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?tlang .
+    ?translation spatrem:genre ?genre .
+    ?issue  spatrem:pubDate ?pubDate ;
+            spatrem:number ?number .
+    OPTIONAL { ?issue spatrem:volume ?volume . }
+"""
+    if "after_date" in active:
+        q += "    FILTER(xsd:integer(?pubDate) > ?_after_date)\n"
+
+    if "before_date" in active:
+        q += "    FILTER(xsd:integer(?pubDate) < ?_before_date)\n"
+
+    q += "    ?translation lrm:R67i_is_part_of ?issue .\n"
+
+    if "language_area" in active:
+        q += "    ?issue spatrem:language_area ?_language_area .\n"
+
+    q += """    ?issue lrm:R67i_is_part_of ?magazine .
+    ?translation crm:P1_is_identified_by / lrm:R33_has_string ?title .
+    ?issue rdfs:label ?issue_label ;
+           dcterms:identifier ?issue_id .
+    ?magazine rdfs:label ?magazine_label ;
+           dcterms:identifier ?magazine_id .
+    ?author rdfs:label ?author_name .
+    ?translator rdfs:label ?translator_name .
+    ?olang rdfs:label ?olangLabel .
+    ?tlang rdfs:label ?tlangLabel .
+"""
+    return q
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def translation_template(active: tuple, keys: tuple, seek: bool) -> tuple[str, str]:
+    """The translation row query for one filter shape and ordering, split
+    around the place of its VALUES block."""
+    head = TRANSLATION_PREFIXES
+    head += f"select distinct {' '.join(TRANSLATION_VARIABLES)} where {{\n"
+    head += translation_patterns(active)
+    if seek:
+        head += seek_filter(keys)
+    tail = "} "
+    if keys:
+        tail += "ORDER BY " + " ".join(sort_key(key) for key in keys) + " "
+    return head, tail
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def translator_patterns(active: tuple) -> str:
+    """The body of the WHERE clause of the translator queries, for the
+    filters named in `active`."""
+    query = """        ?original lrm:R68_is_inspiration_for ?translation .
+        ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by ?translator .
+        ?original lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
+        ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?tlang .
+        ?translation spatrem:genre ?genre .
+        ?translation lrm:R67i_is_part_of / lrm:R67i_is_part_of ?magazine .
+        ?magazine rdfs:label ?magLabel .
+        ?magazine dcterms:identifier ?magKey .
+        ?translator rdfs:label ?label .
+        ?olang rdfs:label ?olangLabel .
+        ?tlang rdfs:label ?tlangLabel .
+        FILTER(?label != "Anon.")
+"""
+    for name in ("gender", "nationality", "language_area"):
+        if name in active:
+            query += f"        ?translator spatrem:{name} ?{name} .\n"
+        else:
+            query += f"        OPTIONAL {{ ?translator spatrem:{name} ?{name} .}}\n"
+
+    for name, op in (("year_birth", ">"), ("year_death", "<")):
+        if name in active:
+            query += f"""        ?translator spatrem:{name} ?{name} .
+        FILTER(?{name} {op} ?_{name})\n"""
+        else:
+            query += f"        OPTIONAL {{ ?translator spatrem:{name} ?{name} .}}\n"
+
+    return query
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def translators_template(active: tuple, sortby: str) -> tuple[str, str]:
+    """The aggregated translators query for one filter shape and sort key,
+    split around the place of its VALUES block."""
+    head = TRANSLATOR_PREFIXES + """
+SELECT ?translator
+       (SAMPLE(?label) AS ?name)
+       (SAMPLE(?gender) AS ?sex)
+       (SAMPLE(?year_birth) AS ?birthDate)
+       (SAMPLE(?year_death) AS ?deathDate)
+"""
+    for column, var in TRANSLATOR_LISTS.items():
+        head += f"""       (GROUP_CONCAT(DISTINCT {var}; separator="{SEPARATOR}") AS ?{column})\n"""
+    head += "WHERE {\n"
+    head += translator_patterns(active)
+
+    tail = "} GROUP BY ?translator ORDER BY "
+    if sortby:
+        tail += f"MIN({sortby}) "
+    tail += "MIN(?label) ?translator "
+    return head, tail
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def facet_counts_template(kind: str, active: tuple) -> tuple[str, tuple, str]:
+    """The grouped facet count query of the translations or translators
+    for one filter shape: a UNION branch per facet, each constrained by
+    every active filter but its own, so a count is what picking that
+    value would return. Each branch is (the filters bound in its VALUES
+    block, the text before it, the text after it)."""
+    if kind == "translations":
+        head = TRANSLATION_PREFIXES
+        patterns, facets, counted = translation_patterns, TRANSLATION_FACETS, "?translation"
+    else:
+        head = TRANSLATOR_PREFIXES
+        patterns, facets, counted = translator_patterns, TRANSLATOR_FACETS, "?translator"
+    head += f"select ?facet ?value (COUNT(DISTINCT {counted}) AS ?count) where {{\n"
+    branches = []
+    for name, var in facets.items():
+        others = tuple(f for f in active if f != name)
+        before = "  {\n" + patterns(others)
+        if kind == "translations" and name == "language_area":
+            before += "    ?issue spatrem:language_area ?language_area .\n"
+        after = f'    BIND("{name}" AS ?facet)\n    BIND({var} AS ?value)\n  }}\n'
+        branches.append((others, before, after))
+    return head, tuple(branches), "} GROUP BY ?facet ?value"
+
+
+async def csv_records(chunks: AsyncIterator[str]) -> AsyncIterator[list[str]]:
+    """Split a stream of CSV text into records, allowing for quoted
+    fields that contain line breaks."""
+    pending = ""
+    record = ""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            record += line + '\n'
+            if record.count('"') % 2 == 0:
+                if record.strip():
+                    yield next(csv.reader([record]))
+                record = ""
+    record += pending
+    if record.strip():
+        yield next(csv.reader([record]))
+
+
+def translator_row(row: dict) -> dict:
+    """The translator dict the templates expect, from an aggregated row."""
+    translator = { "id": row['translator'],
+                   "label": row.get('name'),
+                   "gender": row.get('sex'),
+                   "birthDate": row.get('birthDate'),
+                   "deathDate": row.get('deathDate') }
+    for column in TRANSLATOR_LISTS:
+        value = row.get(column)
+        translator[column] = value.split(SEPARATOR) if value else []
+    return translator
+
+
+async def started(rows: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Wait for the first of `rows`, then return them all as an iterator.
+
+    A stream fails on its first row if it fails at all; awaiting that
+    row before a StreamingResponse starts lets the failure become an
+    error response instead of a truncated body sent under a 200.
+    """
+    try:
+        first = [await rows.__anext__()]
+    except StopAsyncIteration:
+        first = []
+
+    async def chained() -> AsyncIterator[dict]:
+        try:
+            for row in first:
+                yield row
+            async for row in rows:
+                yield row
+        finally:
+            await rows.aclose()
+    return chained()
 
 
 class Kb():
-    def __init__(self, endpoint: str) -> None:
-        self.client: SPARQLWrapper2 = SPARQLWrapper2(endpoint)
+    def __init__(self, endpoint: str,
+                 cache: Optional[FacetCache] = None,
+                 timeout: float = 30.0,
+                 max_connections: int = 10,
+                 max_concurrency: int = 8,
+                 count_cache: Optional[FacetCache] = None,
+                 version_ttl: float = 30.0,
+                 metrics: Optional[QueryMetrics] = None,
+                 result_format: str = "json",
+                 deadline: float = 10.0,
+                 breaker: Optional[CircuitBreaker] = None,
+                 stale_cache: Optional[FacetCache] = None,
+                 queue_timeout: float = 5.0,
+                 max_streams: int = 2,
+                 materialized: bool = False) -> None:
+        if result_format not in ACCEPT:
+            raise ValueError(f"unknown result format {result_format}")
+        self.endpoint = endpoint
+        self.result_format = result_format
+        self.metrics: QueryMetrics = metrics if metrics is not None else QueryMetrics()
+        self.facet_cache: FacetCache = cache if cache is not None else facet_cache
+        self.count_cache: FacetCache = count_cache if count_cache is not None else FacetCache(maxsize=1024)
+        # whether translations are served from an in-memory TranslationTable
+        self.materialized: bool = materialized
+        # name -> (graph version, structure) of the indexes built from the graph
+        self._derived: dict[str, tuple] = {}
+        self._derived_locks: dict[str, asyncio.Lock] = {}
+        self.version_ttl: float = version_ttl
+        self._version: Optional[str] = None
+        self._version_checked: Optional[float] = None
+        # bumped by purge(), to move the graph version on by hand
+        self.generation: int = 0
+        self.timeout = timeout
+        self.deadline = deadline
+        self.queue_timeout = queue_timeout
+        self.breaker: CircuitBreaker = breaker if breaker is not None else CircuitBreaker()
+        # last good result per query text, served while GraphDB is down
+        self.stale_cache: FacetCache = (stale_cache if stale_cache is not None
+                                        else FacetCache(ttl=86400, maxsize=1024))
+        self._refresh: Optional[asyncio.Task] = None
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiter = asyncio.Semaphore(max_concurrency)
+        # streams are held for as long as their client reads, so they get
+        # their own slots and connections instead of starving the queries
+        self.stream_limits = httpx.Limits(max_connections=max_streams,
+                                          max_keepalive_connections=max_streams)
+        self._stream_client: Optional[httpx.AsyncClient] = None
+        self._streams = asyncio.Semaphore(max_streams)
+        # query text -> the task fetching it, shared by identical callers
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # created lazily so the pool belongs to the worker's event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits,
+                                             timeout=self.timeout)
+        return self._client
+
+    @property
+    def stream_client(self) -> httpx.AsyncClient:
+        if self._stream_client is None or self._stream_client.is_closed:
+            self._stream_client = httpx.AsyncClient(limits=self.stream_limits,
+                                                    timeout=self.timeout)
+        return self._stream_client
+
+    async def aclose(self) -> None:
+        """Stop the background refresh, then close the connections."""
+        if self._refresh is not None and not self._refresh.done():
+            self._refresh.cancel()
+            try:
+                await self._refresh
+            except asyncio.CancelledError:
+                pass
+        self._refresh = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._stream_client is not None:
+            await self._stream_client.aclose()
+            self._stream_client = None
+
+    def template_stats(self) -> dict:
+        """Hits and misses of the compiled query templates, per builder."""
+        return { f.__name__: f.cache_info()._asdict()
+                 for f in (translation_template, translation_patterns,
+                           translators_template, translator_patterns,
+                           facet_counts_template) }
+
+    async def open_connections(self, count: Optional[int] = None) -> None:
+        """Fill the connection pool by probing the endpoint with `count`
+        concurrent requests, by default as many as the pool holds."""
+        count = count or self.limits.max_connections
+        responses = await asyncio.gather(*(self.client.get(f"{self.endpoint}/size")
+                                           for _ in range(count)))
+        for response in responses:
+            response.raise_for_status()
+
+    async def graph_version(self) -> Optional[str]:
+        """A cheap token that changes when the graph is reloaded: the
+        statement count, and the number of purges, since a reload that
+        keeps the count cannot be told apart otherwise. None if the
+        count is not known yet."""
+        count = await self.statement_count()
+        return None if count is None else f"{count}.{self.generation}"
+
+    def purge(self) -> int:
+        """Forget what was cached or built from the graph: empty the facet
+        and count caches and move the graph version on, so the indexes
+        are rebuilt and cached responses are not served again. Returns
+        the number of cache entries dropped."""
+        self.generation += 1
+        return self.facet_cache.purge() + self.count_cache.purge()
+
+    async def statement_count(self) -> Optional[str]:
+        """The repository's statement count, probed at most every
+        `version_ttl` seconds, whether the probe succeeds or not. When it
+        changes the facet and count caches are purged. The probe is held
+        to the query deadline and goes through the circuit breaker like
+        a query; when it fails, the last known count is returned, or
+        None if there is none yet.
+        """
+        now = time.monotonic()
+        if self._version_checked is not None and now - self._version_checked < self.version_ttl:
+            return self._version
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            # keep serving what was cached for the last known graph
+            return self._version
+        self._version_checked = now
+        try:
+            response = await asyncio.wait_for(
+                self.client.get(f"{self.endpoint}/size", headers={"Accept": "text/plain"}),
+                self.deadline)
+            if response.status_code >= 500:
+                response.raise_for_status()
+        except (httpx.TransportError, httpx.HTTPStatusError, asyncio.TimeoutError):
+            self.breaker.failure()
+            return self._version
+        except BaseException:
+            if trial:
+                self.breaker.abandon()
+            raise
+        self.breaker.success()
+        if response.is_error:
+            return self._version
+        version = response.text.strip()
+        if self._version is not None and version != self._version:
+            self.facet_cache.purge()
+            self.count_cache.purge()
+        self._version = version
+        return version
+
+    async def query(self, querystring: str, timeout: Optional[float] = None,
+                    name: str = "query", deadline: Optional[float] = None) -> QueryResult:
+        """Run a SELECT query; `name` tags it in the query metrics.
+
+        Identical queries issued while one is in flight are coalesced:
+        the later callers await the first one's result instead of sending
+        their own. The fetch runs as its own task, so a caller that goes
+        away does not cancel it for the others.
+
+        If the endpoint is unavailable, the last good result of the same
+        query is returned instead, the request is marked stale, and a
+        background refresh retries the query.
+        """
+        start = time.perf_counter()
+        task = self._inflight.get(querystring)
+        if task is None:
+            task = asyncio.ensure_future(self.fetch(querystring, timeout, name, deadline))
+            self._inflight[querystring] = task
+            task.add_done_callback(lambda _: self._inflight.pop(querystring, None))
+        else:
+            self.metrics.coalesce(name)
+        try:
+            result = await asyncio.shield(task)
+        except EndpointUnavailable:
+            result = self.stale_cache.get(querystring)
+            if result is None:
+                raise
+            self.metrics.stale(name)
+            timing.mark_stale()
+            self.revalidate(querystring, name)
+        timing.add("sparql", time.perf_counter() - start)
+        # each caller gets its own result, so setting a cursor is private
+        return QueryResult.model_construct(count=result.count, data=result.data)
+
+    async def post(self, querystring: str, timeout: Optional[float] = None,
+                   deadline: Optional[float] = None) -> tuple:
+        """POST the query once a query slot is free; returns the response
+        and the time spent waiting for the slot. The wait is bounded by
+        `queue_timeout` and raises QueueTimeout, the request by `deadline`
+        and raises asyncio.TimeoutError."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._limiter.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError as e:
+            raise QueueTimeout(f"no query slot free after {self.queue_timeout}s") from e
+        try:
+            queued = time.perf_counter()
+            response = await asyncio.wait_for(self.client.post(
+                self.endpoint,
+                data={"query": querystring},
+                headers={"Accept": ACCEPT[self.result_format]},
+                timeout=timeout if timeout is not None else self.timeout),
+                deadline or self.deadline)
+        finally:
+            self._limiter.release()
+        return response, queued - start
+
+    async def fetch(self, querystring: str, timeout: Optional[float] = None,
+                    name: str = "query", deadline: Optional[float] = None) -> QueryResult:
+        """Send a SELECT query to the endpoint.
+
+        The response must arrive within `deadline` seconds (by default
+        the Kb's). Timeouts, transport errors and 5xx responses count
+        against the circuit breaker and raise EndpointUnavailable; while
+        the breaker is open, so does every call, at once. Waiting longer
+        than `queue_timeout` for a query slot raises QueueTimeout, which
+        says nothing about GraphDB and is not counted.
+
+        The results are fetched as SPARQL JSON or TSV, per
+        `result_format`, and decoded in one pass into plain rows.
+        """
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self.metrics.error(name)
+            raise EndpointUnavailable(f"{self.endpoint} is unavailable (circuit open)")
+        start = time.perf_counter()
+        try:
+            response, queue = await self.post(querystring, timeout, deadline)
+            if response.status_code >= 500:
+                response.raise_for_status()
+        except QueueTimeout:
+            if trial:
+                self.breaker.abandon()
+            self.metrics.error(name)
+            raise
+        except (httpx.TransportError, httpx.HTTPStatusError, asyncio.TimeoutError) as e:
+            self.breaker.failure()
+            self.metrics.error(name)
+            raise EndpointUnavailable(f"{self.endpoint} failed: {e!r}") from e
+        except BaseException:
+            # cancelled, or failed in a way that says nothing about GraphDB
+            if trial:
+                self.breaker.abandon()
+            raise
+        self.breaker.success()
+        try:
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.metrics.error(name)
+            raise
+        queued = start + queue
+        fetched = time.perf_counter()
+        if self.result_format == "tsv":
+            results = decode_tsv(response.text)
+        else:
+            results = decode_json(response.content)
+        parsed = time.perf_counter()
+        # the rows are plain dicts already; skip re-validating each one
+        result = QueryResult.model_construct(count=len(results), data=results)
+        self.metrics.record(name, querystring, rows=len(results), nbytes=len(response.content),
+                            queue=queued - start, http=fetched - queued,
+                            parse=parsed - fetched, build=time.perf_counter() - parsed)
+        if len(results) <= STALE_MAX_ROWS:
+            self.stale_cache.set(querystring, result)
+        return result
 
-    def query(self, querystring) -> QueryResult:
-        self.client.setQuery(querystring)
-        res = self.client.query()
-        results =  [{k : v.value for k,v in result.items()}
-                for result in res.bindings]
+    def revalidate(self, querystring: str, name: str) -> None:
+        """Start the background refresh, unless one is already running."""
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self.refresh(querystring, name))
+
+    async def refresh(self, querystring: str, name: str) -> None:
+        """Retry `querystring` until the endpoint answers it; a success
+        closes the breaker, so later calls go to GraphDB again."""
+        while True:
+            await asyncio.sleep(max(self.breaker.retry_in(), 1.0))
+            try:
+                await self.fetch(querystring, name=name)
+                return
+            except EndpointUnavailable:
+                continue
+            except httpx.HTTPError:
+                return
+
+    async def stream(self, querystring: str, timeout: Optional[float] = None,
+                     name: str = "stream") -> AsyncIterator[dict]:
+        """Yield the result rows as GraphDB sends them.
+
+        The results are requested as text/csv so each record can be
+        decoded as soon as its line arrives; unbound values are left out
+        of the row, as in query(). The metrics count the whole transfer
+        as HTTP time.
+
+        The response must start within the Kb's `deadline`. As in
+        fetch(), timeouts, transport errors and 5xx responses count
+        against the circuit breaker and raise EndpointUnavailable, and
+        the stream is refused while the breaker is open. There is no
+        stale fallback; see started().
+
+        At most `max_streams` run at once, on a connection pool of their
+        own; waiting longer than `queue_timeout` for one raises
+        QueueTimeout.
+        """
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self.metrics.error(name)
+            raise EndpointUnavailable(f"{self.endpoint} is unavailable (circuit open)")
+        start = time.perf_counter()
+        rows = 0
+        settled = False
+        try:
+            try:
+                await asyncio.wait_for(self._streams.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError as e:
+                raise QueueTimeout(f"no stream slot free after {self.queue_timeout}s") from e
+            try:
+                queued = time.perf_counter()
+                request = self.stream_client.build_request(
+                    "POST", self.endpoint,
+                    data={"query": querystring},
+                    headers={"Accept": "text/csv"},
+                    timeout=timeout if timeout is not None else self.timeout)
+                response = await asyncio.wait_for(self.stream_client.send(request, stream=True),
+                                                  self.deadline)
+                try:
+                    response.raise_for_status()
+                    header = None
+                    async for record in csv_records(response.aiter_text()):
+                        if header is None:
+                            header = record
+                            continue
+                        rows += 1
+                        yield {k: v for k, v in zip(header, record) if v != ''}
+                    nbytes = response.num_bytes_downloaded
+                finally:
+                    await response.aclose()
+            finally:
+                self._streams.release()
+            self.breaker.success()
+            settled = True
+        except httpx.HTTPStatusError as e:
+            self.metrics.error(name)
+            # a 4xx is the query's fault, not GraphDB's
+            if e.response.status_code < 500:
+                self.breaker.success()
+                settled = True
+                raise
+            self.breaker.failure()
+            settled = True
+            raise EndpointUnavailable(f"{self.endpoint} failed: {e!r}") from e
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            self.breaker.failure()
+            settled = True
+            self.metrics.error(name)
+            raise EndpointUnavailable(f"{self.endpoint} failed: {e!r}") from e
+        except httpx.HTTPError:
+            self.metrics.error(name)
+            raise
+        finally:
+            # the consumer stopped reading, or the stream was cancelled
+            if trial and not settled:
+                self.breaker.abandon()
+        timing.add("sparql", time.perf_counter() - start)
+        self.metrics.record(name, querystring, rows=rows, nbytes=nbytes,
+                            queue=queued - start, http=time.perf_counter() - queued)
+
+
+    @facet
+    async def facets(self) -> dict[str, QueryResult]:
+        """Fetch every facet vocabulary in a single UNION query."""
+        branches = "\n    UNION\n".join(
+            f"""    {{ {pattern}
+        BIND("{name}" AS ?facet) }}"""
+            for name, (_, pattern) in FACETS.items())
+        q = f"""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX dcterms: <http://purl.org/dc/terms/>
+PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
+PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
+select distinct ?facet ?value ?label ?key where {{
+{branches}
+}} ORDER BY ?facet ?value"""
 
-        return QueryResult(count=len(results), data=results)        
+        rows: dict[str, list] = {name: [] for name in FACETS}
+        for row in (await self.query(q, name="facets")).data:
+            columns = FACETS[row['facet']][0]
+            rows[row['facet']].append(
+                {column: row.get(var) for column, var in zip(columns, ('value', 'label', 'key'))})
 
+        return {name: QueryResult(count=len(data), data=data)
+                for name, data in rows.items()}
 
-    def languages(self) -> QueryResult:
+    @facet
+    async def languages(self) -> QueryResult:
         q = """PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 PREFIX dcterms: <http://purl.org/dc/terms/>
@@ -28,36 +877,10 @@ select distinct ?lang ?label ?key where {
        rdfs:label ?label ;
         dcterms:identifier ?key .
 }"""
-        return self.query(q)
-        
-    def source_languages(self) -> QueryResult:
-        q="""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-select distinct ?lang ?label ?key where { 
-        ?original lrm:R68_is_inspiration_for ?translation .
-        ?original lrm:R3i_is_realised_by / crm:P72_has_language ?lang .
-        ?lang rdfs:label ?label .
-        ?lang dcterms:identifier ?key .
-}"""
-        return self.query(q)
+        return await self.query(q, name="languages")
         
-    def target_languages(self) -> QueryResult:
-        q="""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-select distinct ?lang ?label ?key where { 
-        ?original lrm:R68_is_inspiration_for ?translation .
-        ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?lang .
-        ?lang rdfs:label ?label .
-        ?lang dcterms:identifier ?key .
-}"""
-        return self.query(q)
-        
-
-    def dates(self) -> QueryResult:
+    @facet
+    async def dates(self) -> QueryResult:
         q="""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX dcterms: <http://purl.org/dc/terms/>
 PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
@@ -68,52 +891,10 @@ select distinct ?date where {
 ?issue lrm:P2_has_type ?issuetype .
 ?issue spatrem:pubDate ?date .
 } ORDER BY ?date"""
-        return self.query(q)
-
-    def year_births(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?date WHERE {?s spatrem:year_birth ?date .}
-order by ?date"""
-        return self.query(q)
-
-    def year_deaths(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?date WHERE {?s spatrem:year_death ?date .}
-order by ?date"""
-        return self.query(q)
-
-
-    def genres(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?genre where {
-	?s spatrem:genre ?genre .    
-} order by ?genre"""
-        return self.query(q)
-
-    def genders(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?gender where {
-    ?person spatrem:gender ?gender .
-} order by ?gender"""
-        return self.query(q)
- 
-    def nationalities(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?nationality where {
-    ?s spatrem:nationality ?nationality .
-} order by ?nationality"""
-        return self.query(q)
-
- 
-    def language_areas(self) -> QueryResult:
-        q="""PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-select distinct ?language_area where {
-    ?s spatrem:language_area ?language_area .
-} order by ?language_area"""
-        return self.query(q)
-
-
-    def magazines(self) -> QueryResult:
+        return await self.query(q, name="dates")
+
+    @facet
+    async def magazines(self) -> QueryResult:
         q = """PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -126,10 +907,10 @@ WHERE {
                   dcterms:identifier ?key ;
 		  rdfs:label ?label .
 }"""
-        return self.query(q)
+        return await self.query(q, name="magazines")
 
 
-    def magazine(self, key: str) -> dict:
+    async def magazine(self, key: str) -> dict:
 
         q = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
@@ -140,7 +921,7 @@ WHERE {{
         ?magazine dcterms:identifier "{key}" ;
                   rdfs:label ?magLabel .
 }}"""
-        infodata = self.query(q).data[0]
+        infodata = (await self.query(q, name="magazine")).data[0]
         info = { "id": key,
                  "title": infodata['magLabel']
                 }
@@ -164,7 +945,7 @@ WHERE {{
 }} order by ?issueId"""
 
         issues = []
-        for i in self.query(issueq).data:
+        for i in (await self.query(issueq, name="magazine")).data:
             issue = {
                 "id" : i.get('issueId'),
                 "label" : i.get('issueLabel'),
@@ -176,7 +957,83 @@ WHERE {{
 
         return { "info" : info, "issues": issues }
 
-    def issues(self, mag_key: str) -> QueryResult:
+    async def magazine_contents(self, key: str) -> Optional[dict]:
+        """A magazine with all its issues and their constituents, in one
+        query grouped in a single pass, instead of a query for the issue
+        list and two per issue. None if there is no such magazine."""
+        q = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
+PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
+PREFIX dcterms: <http://purl.org/dc/terms/>
+SELECT distinct ?part ?magLabel ?issueId ?issueLabel ?number ?volume ?pubDate
+       ?language_area ?constituent ?title ?langLabel ?translator ?name ?genre
+       ?author ?authorName ?olangLabel
+WHERE {{
+        ?magazine dcterms:identifier {literal(key)} ;
+                  rdfs:label ?magLabel ;
+                  lrm:R67_has_part ?issue .
+        ?issue rdfs:label ?issueLabel ;
+               dcterms:identifier ?issueId ;
+               spatrem:number ?number ;
+               spatrem:pubDate ?pubDate .
+        OPTIONAL {{ ?issue spatrem:volume ?volume . }}
+        {{
+            BIND("issue" AS ?part)
+        }}
+        UNION
+        {{
+            ?issue spatrem:language_area ?language_area .
+            BIND("area" AS ?part)
+        }}
+        UNION
+        {{
+            ?constituent lrm:R67i_is_part_of ?issue ;
+                   lrm:R16i_was_created_by / crm:P14_carried_out_by ?translator ;
+                   crm:P1_is_identified_by / lrm:R33_has_string ?title ;
+                   lrm:R3i_is_realised_by / crm:P72_has_language ?tlang ;
+                   lrm:R68_is_inspired_by ?original ;
+                   spatrem:genre ?genre .
+            ?original lrm:R16i_was_created_by / crm:P14_carried_out_by ?author ;
+                      lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
+            ?author rdfs:label ?authorName .
+            ?tlang rdfs:label ?langLabel .
+            ?olang rdfs:label ?olangLabel .
+            ?translator rdfs:label ?name .
+            BIND("constituent" AS ?part)
+        }}
+}} ORDER BY ?issueId ?part ?title"""
+        rows = (await self.query(q, name="magazine_contents")).data
+        if not rows:
+            return None
+
+        issues: dict[str, dict] = {}
+        for row in rows:
+            issue = issues.get(row['issueId'])
+            if issue is None:
+                issue = issues[row['issueId']] = {
+                    "id": row['issueId'],
+                    "label": row.get('issueLabel'),
+                    "volume": row.get('volume'),
+                    "number": row.get('number'),
+                    "pubDate": row.get('pubDate'),
+                    "language_areas": [],
+                    "constituents": [] }
+            if row['part'] == "area":
+                issue["language_areas"].append(row['language_area'])
+            elif row['part'] == "constituent":
+                issue["constituents"].append({ "title": row['title'],
+                                               "language": row['langLabel'],
+                                               "olanguage": row['olangLabel'],
+                                               "translator": row['translator'],
+                                               "name": row['name'],
+                                               "author": row['author'],
+                                               "authorName": row['authorName'],
+                                               "genre": row['genre'] })
+        return { "info": { "id": key, "title": rows[0]['magLabel'] },
+                 "issues": list(issues.values()) }
+
+    async def issues(self, mag_key: str) -> QueryResult:
         q = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -195,9 +1052,9 @@ WHERE {{
         OPTIONAL {{ ?issue spatrem:volume ?volume . }}
 
 }}"""
-        return self.query(q)
+        return await self.query(q, name="issues")
 
-    def issue(self, issue_key:str):
+    async def issue(self, issue_key:str):
 
         infoq = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
@@ -244,9 +1101,9 @@ WHERE {{
         ?translator rdfs:label ?name .
 
 }}"""
-        info = self.query(infoq).data[0]
+        info = (await self.query(infoq, name="issue")).data[0]
 
-        constituentdata = self.query(constituentq).data
+        constituentdata = (await self.query(constituentq, name="issue")).data
         constituents = []
         for data in constituentdata:
             c = { "title": data['title'],
@@ -269,7 +1126,7 @@ WHERE {{
         result['constituents'] = constituents
         return result
 
-    def constituents(self, issue_key: str) -> QueryResult:
+    async def constituents(self, issue_key: str) -> QueryResult:
         q = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -285,9 +1142,9 @@ WHERE {{
         ?tlang rdfs:label ?langLabel .
         ?translator rdfs:label ?name .
 }}"""
-        return self.query(q)
+        return await self.query(q, name="constituents")
 
-    def constituent(self, con_id: str) -> QueryResult:
+    async def constituent(self, con_id: str) -> QueryResult:
         q = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -313,328 +1170,332 @@ WHERE {{
            spatrem:pubDate ?pubDate .
 
 }}"""
-        return self.query(q)
-
-
-    def construct_translation_query(self, kwargs: dict) -> str:
-        
-        q: str = """PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>        
-select distinct * where {
-	?original lrm:R68_is_inspiration_for ?translation .
-    ?original lrm:R16i_was_created_by / crm:P14_carried_out_by ?author .
-    ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by ?translator .
-    ?original lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
-    ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?tlang .
-        
-    """
-        if kwargs['sl'] and kwargs['sl'] != 'any':
-            q += f"FILTER(?olang =  <{kwargs['sl']}> )\n"
-
-        if kwargs['tl'] and kwargs['tl'] != 'any':
-            q += f"FILTER(?tlang =  <{kwargs['tl']}> )\n"
-
-        q += "?translation spatrem:genre ?genre .\n"
-
-        if kwargs["genre"]  and kwargs['genre'] != 'any':
-            q += f"FILTER(?genre =  '{kwargs['genre']}' )\n"
-
-
-        q += """?issue  spatrem:pubDate ?pubDate ;
-                        spatrem:number ?number .
-                OPTIONAL { ?issue spatrem:volume ?volume . }
-        """
-
-
-        if kwargs["after_date"] and kwargs['after_date'] != 'any':
-            q += f"FILTER(xsd:integer(?pubDate) > {kwargs['after_date']})\n"
-
-        if kwargs["before_date"] and kwargs['before_date'] != 'any':
-            q += f"FILTER(xsd:integer(?pubDate) < {kwargs['before_date']})\n"
-
-
-        q += """?translation lrm:R67i_is_part_of ?issue .\n"""
-
-        if 'language_area' in kwargs and kwargs['language_area'] != 'any':
-            q += f"""?issue spatrem:language_area '{kwargs['language_area']}' .\n"""
-
-        q += """?issue lrm:R67i_is_part_of ?magazine ."""
-
-
-        if kwargs["magazine"] and kwargs['magazine'] != 'any':
-            q += f"FILTER(?magazine = <{kwargs['magazine']}>)\n"
-
-
-        q += """?translation crm:P1_is_identified_by / lrm:R33_has_string ?title . 
-    ?issue rdfs:label ?issue_label ;
-           dcterms:identifier ?issue_id .
-    ?magazine rdfs:label ?magazine_label ;
-           dcterms:identifier ?magazine_id .
-    ?author rdfs:label ?author_name .
-    ?translator rdfs:label ?translator_name .
-    ?olang rdfs:label ?olangLabel .
-    ?tlang rdfs:label ?tlangLabel .
-    """
+        return await self.query(q, name="constituent")
+
+
+    def construct_translation_query(self, kwargs: dict, ordered: bool = True) -> str:
+        """The translation row query: a cached template for the filter
+        shape and ordering, with the filter and cursor values bound in a
+        VALUES block rather than spliced into the text. Unless `ordered`,
+        the rows are only sorted by `sortby`, if given, rather than by
+        every key paging needs."""
+        active = active_filters(kwargs, TRANSLATION_FILTERS)
+        keys = self.translation_sort_keys(kwargs)
+        if not ordered:
+            keys = keys[:1] if kwargs.get("sortby") else []
+        bindings = bind(TRANSLATION_PARAMS, active, kwargs)
+        if kwargs.get("seek"):
+            bindings += seek_bindings(keys, kwargs["seek"])
+
+        head, tail = translation_template(active, tuple(keys), bool(kwargs.get("seek")))
+        return head + values_block(bindings) + tail + paging(kwargs)
+
+    def construct_translation_count_query(self, kwargs: dict) -> str:
+        active = active_filters(kwargs, TRANSLATION_FILTERS)
+        q: str = TRANSLATION_PREFIXES
+        q += "select (COUNT(DISTINCT ?translation) AS ?count) where {\n"
+        q += translation_patterns(active)
+        q += values_block(bind(TRANSLATION_PARAMS, active, kwargs))
         q += "}"
-
-        q += " ORDER BY "
-
-        if "sortby" in kwargs:
-            q += f"{ kwargs['sortby'] }"
-
-        q += " ?magazine_id ?pubDate "
-
-        if "offset" in kwargs:
-            q += f"OFFSET {kwargs['offset']} "
-        
-        if "limit" in kwargs:
-            q += f"LIMIT {kwargs['limit']} "
-
         return q
 
+    async def count_translations(self, kwargs: Optional[dict] = None) -> int:
+        """The number of distinct translations matching the filters,
+        cached per filter signature."""
+        kwargs = kwargs or {}
+        table = await self.translation_table()
+        if table is not None:
+            return table.count(kwargs)
+        signature = tuple(sorted((k, str(v)) for k, v in kwargs.items()
+                                 if k in TRANSLATION_FILTERS and v and v != 'any'))
+        key = (self.endpoint, signature)
+        count = self.count_cache.get(key)
+        if count is None:
+            result = await self.query(self.construct_translation_count_query(dict(signature)),
+                                     name="count_translations")
+            count = int(result.data[0]['count']) if result.data else 0
+            self.count_cache.set(key, count)
+        return count
+
+    def construct_facet_counts_query(self, kind: str, kwargs: dict) -> str:
+        """The facet count query of the "translations" or "translators"
+        form; each UNION branch binds its own filters."""
+        filters, params = ((TRANSLATION_FILTERS, TRANSLATION_PARAMS) if kind == "translations"
+                           else (TRANSLATOR_FILTERS, TRANSLATOR_PARAMS))
+        active = active_filters(kwargs, filters)
+        head, branches, tail = facet_counts_template(kind, active)
+        return head + "  UNION\n".join(before + values_block(bind(params, others, kwargs)) + after
+                                        for others, before, after in branches) + tail
+
+    async def facet_counts(self, kind: str, kwargs: Optional[dict] = None) -> dict[str, dict[str, int]]:
+        """For each dropdown of the "translations" or "translators" form,
+        how many rows picking each value would return given the other
+        filters; values that would return none are left out. Cached per
+        filter signature, like count_translations()."""
+        kwargs = kwargs or {}
+        table = await self.translation_table() if kind == "translations" else None
+        if table is not None:
+            return table.facet_counts(kwargs)
+        filters = TRANSLATION_FILTERS if kind == "translations" else TRANSLATOR_FILTERS
+        signature = tuple(sorted((k, str(v)) for k, v in kwargs.items()
+                                 if k in filters and v and v != 'any'))
+        key = (self.endpoint, kind, signature)
+        counts = self.count_cache.get(key)
+        if counts is None:
+            result = await self.query(self.construct_facet_counts_query(kind, dict(signature)),
+                                      name=f"{kind}_facets")
+            counts = {}
+            for row in result.data:
+                if row.get('value') is not None:
+                    counts.setdefault(row['facet'], {})[row['value']] = int(row['count'])
+            self.count_cache.set(key, counts)
+        return counts
+
+    def construct_translation_extract_query(self) -> str:
+        """Every translation row, unfiltered and unordered, with the
+        language areas of its issue."""
+        q: str = TRANSLATION_PREFIXES + "select distinct * where {\n"
+        q += translation_patterns(())
+        q += "OPTIONAL { ?issue spatrem:language_area ?language_area . }\n"
+        q += "}"
+        return q
 
-
-    def translations(self, page: int, page_size: int, kwargs: dict = {}) -> QueryResult:
-        kwargs["limit"] = page_size
-        offset = page - 1
-        if offset <= 0:
-            offset = 0
-        kwargs["offset"] = offset * page_size
-        
-        query = self.construct_translation_query(kwargs)
-        
-        return self.query(query)
-
-
-    def translators(self, kwargs:dict):
-        query = """PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+    async def translation_table(self) -> Optional[TranslationTable]:
+        """The translation rows as an in-memory TranslationTable, rebuilt
+        once the graph version changes; None unless `materialized`."""
+        if not self.materialized:
+            return None
+        async def build() -> TranslationTable:
+            result = await self.query(self.construct_translation_extract_query(),
+                                      name="materialize", deadline=self.timeout)
+            return TranslationTable(result.data)
+        return await self.derived("table", build)
+
+    async def materialize(self) -> TranslationTable:
+        """Serve translations from the in-memory TranslationTable: from
+        then on translations(), count_translations() and facet_counts()
+        filter, sort and page locally, and SPARQL is only used to rebuild
+        the table when the graph changes."""
+        self.materialized = True
+        return await self.translation_table()
+
+    async def derived(self, name: str, build) -> object:
+        """The structure `name`, made by `await build()` on first use and
+        rebuilt once the graph version changes."""
+        version = await self.graph_version()
+        lock = self._derived_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            built = self._derived.get(name)
+            if built is None or (version is not None and version != built[0]):
+                built = self._derived[name] = (version, await build())
+        return built[1]
+
+    async def search_index(self) -> SearchIndex:
+        """The full-text index over titles, authors, translators and
+        issues, built from the translation and translator rows."""
+        async def build() -> SearchIndex:
+            table = await self.translation_table()
+            if table is not None:
+                rows = [table.row(i) for i in range(table.size)]
+            else:
+                result = await self.query(self.construct_translation_extract_query(),
+                                          name="search_index", deadline=self.timeout)
+                rows = result.data
+            return SearchIndex(rows, await self.translators({}))
+        return await self.derived("search", build)
+
+    async def name_index(self) -> NameIndex:
+        """The autocomplete index of translator, author and magazine
+        names, alternate names included."""
+        q = """PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
+PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
 PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-
-SELECT distinct *
-WHERE {
+select distinct ?kind ?id ?key ?label ?name where {
+    {
         ?original lrm:R68_is_inspiration_for ?translation .
-        ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by ?translator .
-        ?original lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
-        ?translation lrm:R3i_is_realised_by / crm:P72_has_language ?tlang .
-"""
-        if 'sl' in kwargs and kwargs['sl'] != 'any':
-            query += f"FILTER(?olang = <{kwargs['sl']}>)\n"
-
-        if 'tl' in kwargs and kwargs['tl'] != 'any':
-            query += f"FILTER(?tlang = <{kwargs['tl']}>)\n"
-
-        query += "?translation spatrem:genre ?genre .\n"
-        if 'genre' in kwargs and kwargs['genre'] != 'any':
-            query += f"FILTER(?genre = '{kwargs['genre']}')\n"
-
-
-        query += "?translation lrm:R67i_is_part_of / lrm:R67i_is_part_of ?magazine .\n"
-        if 'magazine' in kwargs and kwargs['magazine'] != 'any':
-            query += f"FILTER(?magazine = <{kwargs['magazine']}>)\n"
-
-        query += """?magazine rdfs:label ?magLabel .
-        ?magazine dcterms:identifier ?magKey .
-        ?translator rdfs:label ?label .
-	?olang rdfs:label ?olangLabel .
-        ?tlang rdfs:label ?tlangLabel .
-        FILTER(?label != "Anon.")
-"""
-        if 'gender' in kwargs and kwargs['gender'] != 'any':
-            query += f"""?translator spatrem:gender ?gender .
-            FILTER(?gender = '{kwargs['gender']}')
-            """
-        else:
-            query += "OPTIONAL { ?translator spatrem:gender ?gender .}\n"
-
-
-        if 'nationality' in kwargs and kwargs['nationality'] != 'any':
-            query += f"""?translator spatrem:nationality ?nationality .
-            FILTER(?nationality = '{kwargs['nationality']}')
-            """
-        else:
-            query += "OPTIONAL { ?translator spatrem:nationality ?nationality .}\n"
-
-        if 'language_area' in kwargs and kwargs['language_area'] != 'any':
-            query += f"""?translator spatrem:language_area ?language_area .
-            FILTER(?language_area = '{kwargs['language_area']}')
-            """
-        else:
-            query += "OPTIONAL { ?translator spatrem:language_area ?language_area .}\n"
-
-        if 'year_birth' in kwargs and kwargs['year_birth'] != 'any':
-            query += f"""?translator spatrem:year_birth ?year_birth .
-            FILTER(?year_birth > '{kwargs['year_birth']}')
-            """
+        {
+            ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by ?id .
+            BIND("translator" AS ?kind)
+        }
+        UNION
+        {
+            ?original lrm:R16i_was_created_by / crm:P14_carried_out_by ?id .
+            BIND("author" AS ?kind)
+        }
+        ?id rdfs:label ?label .
+        OPTIONAL { ?id crm:P1_is_identified_by / lrm:R33_has_string ?name . }
+        BIND(REPLACE(STR(?id), "^.*/", "") AS ?key)
+    }
+    UNION
+    {
+        ?type dcterms:identifier "journal" .
+        ?id a lrm:F18_Serial_Work ;
+            lrm:P2_has_type ?type ;
+            dcterms:identifier ?key ;
+            rdfs:label ?label .
+        BIND("magazine" AS ?kind)
+    }
+}"""
+        async def build() -> NameIndex:
+            result = await self.query(q, name="name_index", deadline=self.timeout)
+            return NameIndex(result.data)
+        return await self.derived("names", build)
+
+    async def stats_cube(self) -> StatsCube:
+        """Translation counts by language pair, genre, magazine, language
+        area and decade, from the flattened translation rows."""
+        async def build() -> StatsCube:
+            result = await self.query(self.construct_translation_extract_query(),
+                                      name="stats_cube", deadline=self.timeout)
+            return StatsCube(result.data)
+        return await self.derived("stats", build)
+
+    def translation_sort_keys(self, kwargs: dict) -> list[str]:
+        keys = list(TRANSLATION_ORDER)
+        if kwargs.get("sortby"):
+            if kwargs["sortby"] not in TRANSLATION_VARIABLES:
+                raise ValueError(f"cannot sort by {kwargs['sortby']}")
+            keys.insert(0, kwargs["sortby"])
+        return keys
+
+    async def translations(self, page: int, page_size: int,
+                           kwargs: Optional[dict] = None,
+                           cursor: Optional[str] = None) -> QueryResult:
+        """A page of translations, addressed either by page number or by
+        the cursor returned with the previous page.
+
+        A cursor seeks past the last row of the previous page instead of
+        skipping rows with OFFSET, so deep pages cost as much as the first.
+        One row more than the page is fetched, so the cursor is only set
+        when another page follows.
+        """
+        kwargs = dict(kwargs or {})
+        kwargs["limit"] = page_size + 1 if page_size else 0
+        if cursor:
+            kwargs["seek"] = decode_cursor(cursor, kwargs.get("sortby"))
         else:
-            query += "OPTIONAL { ?translator spatrem:year_birth ?year_birth .}\n"
-
-        if 'year_death' in kwargs and kwargs['year_death'] != 'any':
-            query += f"""?translator spatrem:year_death ?year_death .
-            FILTER(?year_death < '{kwargs['year_death']}')
-            """
+            offset = page - 1
+            if offset <= 0:
+                offset = 0
+            kwargs["offset"] = offset * page_size
+
+        table = await self.translation_table()
+        if table is not None:
+            rows = table.select(kwargs, self.translation_sort_keys(kwargs),
+                                offset=kwargs.get("offset", 0),
+                                limit=kwargs["limit"] or None,
+                                seek=kwargs.get("seek"))
+            result = QueryResult.model_construct(count=len(rows), data=rows)
         else:
-            query += "OPTIONAL { ?translator spatrem:year_death ?year_death .}\n"
-
-
-
-        query += """
-} ORDER BY """
-
-        if 'sortby' in kwargs:
-            query += f"{kwargs['sortby']} "
-
-        query += "?label"
-            
-            
-        result = self.query(query)
-
-        translators = {}
-
-        for row in result.data:
-            id = row['translator']
-            if id not in translators:
-                translators[row['translator']] = { "id" : id,
-                                                   "label" : row.get('label'),
-                                                   "gender": row.get('gender'),
-                                                   "birthDate": row.get('birthDate'),
-                                                   "deathDate": row.get('deathDate'),
-                                                   "nationalities": [],
-                                                   "language_areas": [],
-                                                   "source_langs": [],
-                                                   "target_langs": [],
-                                                   "genres" : [],
-                                                   "magazines": []
-                                                  }
-                
-            if 'nationality' in row and row['nationality'] not in translators[id]['nationalities']:
-                translators[id]['nationalities'].append(row['nationality'])
-
-            if 'language_area' in row and row['language_area'] not in translators[id]['language_areas']:
-                translators[id]['language_areas'].append(row['language_area'])
-
-            if 'genre' in row and row['genre'] not in translators[id]['genres']:
-                translators[id]['genres'].append(row['genre'])
-
-            if 'magLabel' in row and row['magLabel'] not in translators[id]['magazines']:
-                translators[id]['magazines'].append(row['magLabel'])
-
-            if 'olangLabel' in row and row['olangLabel'] not in translators[id]['source_langs']:
-                translators[id]['source_langs'].append(row['olangLabel'])
-
-            if 'tlangLabel' in row and row['tlangLabel'] not in translators[id]['target_langs']:
-                translators[id]['target_langs'].append(row['tlangLabel'])
-
-        # return result
-        return translators.values()
-
-
-    def tlator2(self, uriref):
-        workq = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-PREFIX person: <http://spacesoftranslation.org/ns/people/> 
-PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-select distinct ?authorLabel ?olangLabel ?tlangLabel ?magLabel ?genre where {{
-    Filter(?persLabel = 'Alegiani, Conte')
-    ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by person:{uriref} ;
-                     crm:P1_is_identified_by / lrm:R33_has_string ?title ;
-                     lrm:R3i_is_realised_by / crm:P72_has_language ?tlang ;
-                     lrm:R67i_is_part_of / lrm:R67i_is_part_of ?magazine ;
-                     spatrem:genre ?genre .
-    
-    ?original lrm:R68_is_inspiration_for ?translation ;
-    		  lrm:R16i_was_created_by / crm:P14_carried_out_by ?author ;
-    			lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
-    
-
-        ?tlang rdfs:label ?tlangLabel .
-    	?author rdfs:label ?authorLabel .
-    	?person rdfs:label ?persLabel .
-    	?olang rdfs:label ?olangLabel .
-        ?magazine rdfs:label ?magLabel .
+            query = self.construct_translation_query(kwargs)
+            result = await self.query(query, name="translations")
+
+        if page_size and result.count > page_size:
+            result.data = result.data[:page_size]
+            result.count = page_size
+            last = result.data[-1]
+            keys = self.translation_sort_keys(kwargs)
+            result.cursor = encode_cursor(kwargs.get("sortby"),
+                                          [last.get(key[1:], "") for key in keys])
+        return result
 
-       }}"""
-        
-        results = self.query(workq)
-        sl = set()
-        tl = set()
-        authors = set()
-        magazines = set()
-        genres = set()
 
-        for row in results.data:
-            sl.add(row['olangLabel'])
-            tl.add(row['tlangLabel'])
-            authors.add(row['authorLabel'])
-            magazines.add(row['maglabel'])
-            genres.add(row['genre'])
-            
-    
-    def translator(self, uriref):
-        infoq = f"""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
+    def iter_translations(self, kwargs: dict) -> AsyncIterator[dict]:
+        """Every translation row passing the filters, as GraphDB sends it.
+        The query is built here, so bad filters raise before streaming.
+        It is left unordered unless `sortby` is given, so GraphDB can
+        send the first rows before it has found the last."""
+        kwargs = {k: v for k, v in kwargs.items() if k not in ("offset", "limit", "seek")}
+        return self.stream(self.construct_translation_query(kwargs, ordered=False),
+                           name="iter_translations")
+
+
+    def construct_translators_query(self, kwargs: dict) -> str:
+        """One row per translator: the multi-valued columns are folded on
+        the server with GROUP_CONCAT instead of in Python. The template
+        is cached per filter shape and sort key; the values are bound in
+        a VALUES block."""
+        sortby = kwargs.get('sortby') or ""
+        if sortby and sortby not in TRANSLATOR_SORT_KEYS:
+            raise ValueError(f"cannot sort by {sortby}")
+        active = active_filters(kwargs, TRANSLATOR_FILTERS)
+        head, tail = translators_template(active, sortby)
+        return (head + values_block(bind(TRANSLATOR_PARAMS, active, kwargs))
+                + tail + paging(kwargs))
+
+    async def translators(self, kwargs:dict, page: int = 1, page_size: int = 0):
+        """The translators matching the filters; page_size 0 means all."""
+        return await self.translator_rows(kwargs, offset=max(page - 1, 0) * page_size,
+                                          limit=page_size)
+
+    async def translator_rows(self, kwargs: dict, offset: int = 0, limit: int = 0) -> list[dict]:
+        """Like iter_translators(), but fetched in one query, so with its
+        deadline and stale fallback."""
+        query = self.construct_translators_query(dict(kwargs, offset=offset, limit=limit))
+        result = await self.query(query, name="translators")
+        return [translator_row(row) for row in result.data]
+
+    def iter_translators(self, kwargs: dict, offset: int = 0, limit: int = 0) -> AsyncIterator[dict]:
+        """Like translators(), but yields each translator as it arrives.
+        The query is built here, so bad filters raise before streaming."""
+        query = self.construct_translators_query(dict(kwargs, offset=offset, limit=limit))
+        return (translator_row(row) async for row in self.stream(query, name="iter_translators"))
+
+
+    def translator_query(self, uriref: str) -> str:
+        """Info, works and names of one translator in a single query.
+
+        Every UNION branch is anchored on the translator's IRI, so the
+        cost follows that person's works rather than the whole graph.
+        """
+        return f"""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
 PREFIX dcterms: <http://purl.org/dc/terms/>
 PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
 PREFIX person: <http://spacesoftranslation.org/ns/people/> 
 
-SELECT distinct ?label ?birthDate  ?deathDate ?gender ?nationality ?language_area WHERE {{
-    person:{uriref} rdfs:label ?label . 	
-    OPTIONAL {{ person:{uriref} spatrem:year_birth ?birthDate .}}
-    OPTIONAL {{ person:{uriref} spatrem:year_death ?deathDate .}}
-    OPTIONAL {{ person:{uriref} spatrem:gender ?gender .}}
-    OPTIONAL {{ person:{uriref} spatrem:nationality ?nationality .}}
-    OPTIONAL {{ person:{uriref} spatrem:language_area ?language_area .}}
-}} ORDER BY ?label"""
-
-        worksq = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-PREFIX person: <http://spacesoftranslation.org/ns/people/> 
-PREFIX dcterms: <http://purl.org/dc/terms/>
-PREFIX spatrem: <http://spacesoftranslation.org/ns/spatrem/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-select distinct ?authorLabel ?olangLabel ?tlangLabel ?magLabel ?genre where {{
-    Filter(?persLabel = 'Alegiani, Conte')
-    ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by person:{uriref} ;
+select distinct ?part ?label ?birthDate ?deathDate ?gender ?nationality ?language_area
+       ?authorLabel ?olangLabel ?tlangLabel ?magLabel ?genre ?name where {{
+    {{
+        person:{uriref} rdfs:label ?label .
+        OPTIONAL {{ person:{uriref} spatrem:year_birth ?birthDate .}}
+        OPTIONAL {{ person:{uriref} spatrem:year_death ?deathDate .}}
+        OPTIONAL {{ person:{uriref} spatrem:gender ?gender .}}
+        OPTIONAL {{ person:{uriref} spatrem:nationality ?nationality .}}
+        OPTIONAL {{ person:{uriref} spatrem:language_area ?language_area .}}
+        BIND("info" AS ?part)
+    }}
+    UNION
+    {{
+        ?translation lrm:R16i_was_created_by / crm:P14_carried_out_by person:{uriref} ;
                      crm:P1_is_identified_by / lrm:R33_has_string ?title ;
                      lrm:R3i_is_realised_by / crm:P72_has_language ?tlang ;
                      lrm:R67i_is_part_of / lrm:R67i_is_part_of ?magazine ;
                      spatrem:genre ?genre .
-    
-    ?original lrm:R68_is_inspiration_for ?translation ;
-    		  lrm:R16i_was_created_by / crm:P14_carried_out_by ?author ;
-    			lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
-    
-
+        ?original lrm:R68_is_inspiration_for ?translation ;
+                  lrm:R16i_was_created_by / crm:P14_carried_out_by ?author ;
+                  lrm:R3i_is_realised_by / crm:P72_has_language ?olang .
         ?tlang rdfs:label ?tlangLabel .
-    	?author rdfs:label ?authorLabel .
-    	?person rdfs:label ?persLabel .
-    	?olang rdfs:label ?olangLabel .
+        ?author rdfs:label ?authorLabel .
+        ?olang rdfs:label ?olangLabel .
         ?magazine rdfs:label ?magLabel .
-
-       }}"""
-
-        namesq = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
-        PREFIX person: <http://spacesoftranslation.org/ns/people/> 
-PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
-select distinct ?name where {{
+        BIND("work" AS ?part)
+    }}
+    UNION
+    {{
         person:{uriref} crm:P1_is_identified_by / lrm:R33_has_string ?name .
-        }} """
+        BIND("name" AS ?part)
+    }}
+}} ORDER BY ?part ?label"""
 
+    async def translator(self, uriref):
+        rows = (await self.query(self.translator_query(uriref), name="translator")).data
 
-        info = self.query(infoq).data[0]
-        works = self.query(worksq).data
-        names = self.query(namesq).data
+        info = [row for row in rows if row['part'] == 'info'][0]
+        works = [row for row in rows if row['part'] == 'work']
+        names = [row for row in rows if row['part'] == 'name']
 
         sl = set()
         tl = set()
@@ -673,7 +1534,7 @@ select distinct ?name where {{
 
 #########
 
-    def translatorOld(self, uriref):
+    async def translatorOld(self, uriref):
         infoq = f"""PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
@@ -691,7 +1552,7 @@ SELECT distinct ?label ?birthDate  ?deathDate ?gender ?nationality ?language_are
     OPTIONAL {{ person:{uriref} spatrem:language_area ?language_area .}}
 }} ORDER BY ?label"""
 
-        infodata = self.query(infoq).data[0]
+        infodata = (await self.query(infoq, name="translatorOld")).data[0]
         info = { "label" : infodata.get('label'),
                  "birthDate" : infodata.get('birthDate'),
                  "deathDate" : infodata.get('deathDate'),
@@ -730,7 +1591,7 @@ select distinct * where {{
 
 
         works = []
-        for data in self.query(worksq).data:
+        for data in (await self.query(worksq, name="translatorOld")).data:
             work = {
                 "title": data['title'],
                 "language": data['language'],
@@ -748,13 +1609,13 @@ select distinct ?name where {{
         person:{uriref} crm:P1_is_identified_by / lrm:R33_has_string ?name .
         }} """
 
-        names = [n['name'] for n in self.query(namesq).data]
+        names = [n['name'] for n in (await self.query(namesq, name="translatorOld")).data]
 
         return { "works": works, "names": names, "info": info }
 
 ########
 
-    def author(self, uriref):
+    async def author(self, uriref):
         worksq = f"""PREFIX lrm: <http://iflastandards.info/ns/lrm/lrmer/>
 PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>
 PREFIX person: <http://spacesoftranslation.org/ns/people/> 
@@ -780,4 +1641,4 @@ select distinct * where {{
            spatrem:pubDate ?pubDate .
 
         }}"""
-        return self.query(worksq)
+        return await self.query(worksq, name="author")
@@ -0,0 +1,114 @@
+import logging
+from collections import defaultdict
+from threading import Lock
+
+
+logger = logging.getLogger("spatrem.sparql")
+
+PHASES = ("queue", "http", "parse", "build")
+
+
+class QueryStats():
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.rows = 0
+        self.bytes = 0
+        self.max_seconds = 0.0
+        self.seconds = {phase: 0.0 for phase in PHASES}
+
+
+class QueryMetrics():
+    """Timings, row counts and bytes of the SPARQL queries, per Kb method.
+
+    Each query is recorded under the name of the Kb method that issued
+    it, with its wall time split into the wait for a connection slot,
+    the HTTP round-trip, result parsing and row construction. Queries
+    slower than `slow_ms` are logged with their SPARQL text.
+    """
+    def __init__(self, slow_ms: float = 1000.0) -> None:
+        self.slow_ms = slow_ms
+        self.stats: dict[str, QueryStats] = defaultdict(QueryStats)
+        self._lock = Lock()
+
+    def record(self, name: str, querystring: str, rows: int, nbytes: int,
+               **seconds: float) -> None:
+        total = sum(seconds.values())
+        with self._lock:
+            stats = self.stats[name]
+            stats.calls += 1
+            stats.rows += rows
+            stats.bytes += nbytes
+            stats.max_seconds = max(stats.max_seconds, total)
+            for phase, value in seconds.items():
+                stats.seconds[phase] += value
+
+        if self.slow_ms >= 0 and total * 1000 > self.slow_ms:
+            logger.warning("slow query %s: %.0f ms, %d rows, %d bytes\n%s",
+                           name, total * 1000, rows, nbytes, querystring)
+
+    def error(self, name: str) -> None:
+        with self._lock:
+            self.stats[name].errors += 1
+
+    def coalesce(self, name: str) -> None:
+        """Count a call that awaited an identical query in flight."""
+        with self._lock:
+            self.stats[name].coalesced += 1
+
+    def stale(self, name: str) -> None:
+        """Count a call answered from the last good result."""
+        with self._lock:
+            self.stats[name].stale += 1
+
+    def render(self) -> str:
+        """The statistics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP spatrem_sparql_queries_total SPARQL queries issued, by Kb method.",
+            "# TYPE spatrem_sparql_queries_total counter",
+        ]
+        with self._lock:
+            items = sorted(self.stats.items())
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_queries_total{{query="{name}"}} {stats.calls}')
+
+        lines += ["# HELP spatrem_sparql_errors_total SPARQL queries that failed, by Kb method.",
+                  "# TYPE spatrem_sparql_errors_total counter"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_errors_total{{query="{name}"}} {stats.errors}')
+
+        lines += ["# HELP spatrem_sparql_coalesced_total Calls served by an identical query in flight.",
+                  "# TYPE spatrem_sparql_coalesced_total counter"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_coalesced_total{{query="{name}"}} {stats.coalesced}')
+
+        lines += ["# HELP spatrem_sparql_stale_total Calls answered from the last good result.",
+                  "# TYPE spatrem_sparql_stale_total counter"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_stale_total{{query="{name}"}} {stats.stale}')
+
+        lines += ["# HELP spatrem_sparql_seconds_total Time spent on SPARQL queries, by phase.",
+                  "# TYPE spatrem_sparql_seconds_total counter"]
+        for name, stats in items:
+            for phase in PHASES:
+                lines.append(f'spatrem_sparql_seconds_total{{query="{name}",phase="{phase}"}} '
+                             f'{stats.seconds[phase]:.6f}')
+
+        lines += ["# HELP spatrem_sparql_max_seconds Slowest SPARQL query, by Kb method.",
+                  "# TYPE spatrem_sparql_max_seconds gauge"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_max_seconds{{query="{name}"}} {stats.max_seconds:.6f}')
+
+        lines += ["# HELP spatrem_sparql_rows_total Result rows received.",
+                  "# TYPE spatrem_sparql_rows_total counter"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_rows_total{{query="{name}"}} {stats.rows}')
+
+        lines += ["# HELP spatrem_sparql_bytes_total Result bytes received.",
+                  "# TYPE spatrem_sparql_bytes_total counter"]
+        for name, stats in items:
+            lines.append(f'spatrem_sparql_bytes_total{{query="{name}"}} {stats.bytes}')
+
+        return "\n".join(lines) + "\n"
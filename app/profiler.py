@@ -0,0 +1,52 @@
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler():
+    """Sample the stack of the calling thread from a background thread.
+
+    Used as a context manager around the code to profile. Every
+    `interval` seconds the stack of the thread that entered it is read
+    through sys._current_frames() and counted; folded() returns the
+    counts in the folded format read by flamegraph.pl and speedscope.
+    On the event loop thread, samples also catch whatever other requests
+    run at the same time, and idle time shows as the selector wait.
+    """
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "Sampler":
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="spatrem-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
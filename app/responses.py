@@ -0,0 +1,46 @@
+import json
+from typing import Any
+from pydantic import BaseModel
+from starlette.responses import Response
+from app.kb import QueryResult
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(value: Any):
+    if isinstance(value, QueryResult):
+        return { "count": value.count, "data": value.data, "cursor": value.cursor }
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=default)
+    return json.dumps(content, default=default, ensure_ascii=False,
+                      separators=(",", ":")).encode()
+
+
+def serialize(content: Any) -> bytes:
+    """`content` as JSON bytes, without validation or jsonable_encoder.
+
+    A QueryResult keeps its bytes, so the cached vocabulary results are
+    only serialized once.
+    """
+    if isinstance(content, QueryResult):
+        if content._json is None:
+            content._json = dumps(content)
+        return content._json
+    return dumps(content)
+
+
+class FastJSONResponse(Response):
+    """A JSON response for the /api routes, which return plain rows."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return serialize(content)
@@ -0,0 +1,201 @@
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Optional
+
+
+word = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase `text` and strip its accents: "Ëmil" -> "emil"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return word.findall(fold(text)) if text else []
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def key(iri: str) -> str:
+    return iri.rsplit('/', 1)[-1]
+
+
+class SearchIndex():
+    """An inverted index over titles, authors, translators and issues.
+
+    Each document is a hit with a label and a link. Query terms match
+    whole tokens, then token prefixes, then tokens sharing enough
+    trigrams, so "rilk" finds "Rilke" and so does "rilkke". Every term
+    of the query must match; hits are ranked by the idf-weighted sum of
+    their terms' matches.
+    """
+    # weight of an exact, a full-length prefix and a trigram match of a term
+    EXACT = 1.0
+    PREFIX = 0.6
+    FUZZY = 0.3
+    # minimum trigram similarity of a fuzzy match
+    SIMILARITY = 0.3
+
+    def __init__(self, translations: list[dict], translators: list[dict]) -> None:
+        self.docs: list[dict] = []
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        seen: set = set()
+
+        def add(kind: str, label: Optional[str], url: str, detail: str = "",
+                ident: Optional[str] = None) -> None:
+            # documents sharing a url are told apart by `ident`, if given
+            if not label or (kind, ident or url, label) in seen:
+                return
+            seen.add((kind, ident or url, label))
+            doc = len(self.docs)
+            self.docs.append({ "kind": kind, "label": label, "url": url, "detail": detail })
+            tokens = tokenize(label)
+            for token in tokens:
+                self.postings[token][doc] = self.postings[token].get(doc, 0.0) + 1.0 / len(tokens)
+
+        for row in translations:
+            issue = f"/issues/{row['issue_id']}" if row.get('issue_id') else ""
+            add("translation", row.get('title'), issue,
+                " · ".join(v for v in (row.get('translator_name'), row.get('issue_label')) if v),
+                row.get('translation'))
+            if row.get('author'):
+                add("author", row.get('author_name'), f"/authors/{key(row['author'])}")
+            if row.get('issue_id'):
+                add("issue", row.get('issue_label'), issue, row.get('magazine_label') or "")
+        for translator in translators:
+            add("translator", translator.get('label'), f"/translators/{key(translator['id'])}",
+                ", ".join(translator.get('magazines') or []))
+
+        self.vocabulary: list[str] = sorted(self.postings)
+        self.grams: dict[str, set[str]] = defaultdict(set)
+        for token in self.vocabulary:
+            for gram in trigrams(token):
+                self.grams[gram].add(token)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def idf(self, token: str) -> float:
+        return math.log(1 + len(self.docs) / len(self.postings[token]))
+
+    def expand(self, term: str) -> dict[str, float]:
+        """Index tokens matching `term`, with the weight of the match."""
+        matches: dict[str, float] = {}
+        if term in self.postings:
+            matches[term] = self.EXACT
+        i = bisect_left(self.vocabulary, term)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            # "1" should favour "1" over "10", "10" over "1934"
+            matches.setdefault(self.vocabulary[i], self.PREFIX * len(term) / len(self.vocabulary[i]))
+            i += 1
+        if not matches and len(term) >= 3:
+            grams = trigrams(term)
+            shared: dict[str, int] = defaultdict(int)
+            for gram in grams:
+                for token in self.grams.get(gram, ()):
+                    shared[token] += 1
+            for token, count in shared.items():
+                similarity = count / len(grams | trigrams(token))
+                if similarity >= self.SIMILARITY:
+                    matches[token] = self.FUZZY * similarity
+        return matches
+
+    def search(self, text: str, limit: int = 20, kind: Optional[str] = None) -> list[dict]:
+        terms = tokenize(text)
+        if not terms:
+            return []
+        scores: Optional[dict[int, float]] = None
+        for term in dict.fromkeys(terms):
+            term_scores: dict[int, float] = defaultdict(float)
+            for token, weight in self.expand(term).items():
+                idf = self.idf(token)
+                for doc, tf in self.postings[token].items():
+                    term_scores[doc] = max(term_scores[doc], weight * idf * (1 + tf))
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc: score + term_scores[doc]
+                          for doc, score in scores.items() if doc in term_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(((score, doc) for doc, score in scores.items()
+                         if kind is None or self.docs[doc]["kind"] == kind),
+                        key=lambda hit: (-hit[0], len(self.docs[hit[1]]["label"])))
+        return [dict(self.docs[doc], score=round(score, 3)) for score, doc in ranked[:limit]]
+
+
+class NameIndex():
+    """Prefix lookup of translator, author and magazine names.
+
+    Every folded name, and every tail of it starting at a word, is kept
+    in one sorted array per kind, so "emil" finds "Person0, Ëmil0". A
+    lookup is a bisect followed by a scan of at most the matches it
+    returns, whatever the size of the corpus.
+    """
+    KINDS = ("translator", "author", "magazine")
+    URLS = { "translator": "/translators/{}",
+             "author": "/authors/{}",
+             "magazine": "/magazines/{}" }
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.entries: list[dict] = []
+        self.keys: dict[str, list[str]] = {}
+        self.refs: dict[str, list[int]] = {}
+        self.names: dict[str, list[str]] = {}
+        ids: dict[tuple, int] = {}
+        pairs: dict[str, set] = {kind: set() for kind in self.KINDS}
+        for row in rows:
+            kind = row.get('kind')
+            if kind not in pairs or not row.get('label'):
+                continue
+            ident = (kind, row['key'])
+            entry = ids.get(ident)
+            if entry is None:
+                entry = ids[ident] = len(self.entries)
+                self.entries.append({ "kind": kind,
+                                      "key": row['key'],
+                                      "label": row['label'],
+                                      "url": self.URLS[kind].format(row['key']) })
+            for name in (row['label'], row.get('name')):
+                if not name:
+                    continue
+                folded = " ".join(tokenize(name))
+                for match in word.finditer(folded):
+                    pairs[kind].add((folded[match.start():], entry, name))
+
+        for kind, kind_pairs in pairs.items():
+            ordered = sorted(kind_pairs)
+            self.keys[kind] = [tail for tail, _, _ in ordered]
+            self.refs[kind] = [entry for _, entry, _ in ordered]
+            self.names[kind] = [name for _, _, name in ordered]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, text: str, kind: str, limit: int = 10) -> list[dict]:
+        """Up to `limit` names of `kind` with a word starting with `text`;
+        each hit carries the name it matched, which may be an alternate
+        name of the entry."""
+        if kind not in self.keys:
+            raise ValueError(f"unknown kind {kind}")
+        prefix = " ".join(tokenize(text))
+        if not prefix:
+            return []
+        keys, refs, names = self.keys[kind], self.refs[kind], self.names[kind]
+        hits: dict[int, dict] = {}
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(hits) < limit and keys[i].startswith(prefix):
+            entry = refs[i]
+            if entry not in hits:
+                hits[entry] = dict(self.entries[entry], match=names[i])
+            i += 1
+        return list(hits.values())
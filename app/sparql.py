@@ -0,0 +1,59 @@
+import re
+
+
+# characters that may not appear in an IRIREF
+iri_forbidden = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+def literal(value) -> str:
+    """Render a Python value as a quoted SPARQL string literal."""
+    escaped = (str(value).replace('\\', '\\\\')
+               .replace('"', '\\"')
+               .replace('\n', '\\n')
+               .replace('\r', '\\r'))
+    return f'"{escaped}"'
+
+
+def iri(value) -> str:
+    """Render `value` as an IRI reference, or raise ValueError if it
+    cannot be one."""
+    value = str(value)
+    if not value or iri_forbidden.search(value):
+        raise ValueError(f"invalid IRI: {value!r}")
+    return f"<{value}>"
+
+
+def integer(value) -> str:
+    try:
+        return str(int(value))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid integer: {value!r}") from e
+
+
+TERMS = { "iri": iri,
+          "literal": literal,
+          "integer": integer }
+
+
+def values_block(bindings: list[tuple[str, str]]) -> str:
+    """A one-row VALUES block binding each variable to its term.
+
+    It goes at the end of the group it constrains: the join is the same
+    wherever it is written, but some engines only push bindings forward
+    into the patterns that follow.
+    """
+    if not bindings:
+        return ""
+    variables = " ".join(var for var, _ in bindings)
+    terms = " ".join(term for _, term in bindings)
+    return f"    VALUES ({variables}) {{ ({terms}) }}\n"
+
+
+def bind(params: dict, active: tuple, kwargs: dict) -> list[tuple[str, str]]:
+    """The variable and rendered term of each active filter in `kwargs`;
+    `params` maps a filter name to its variable and term kind."""
+    bindings = []
+    for name in active:
+        var, kind = params[name]
+        bindings.append((var, TERMS[kind](kwargs[name])))
+    return bindings
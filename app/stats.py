@@ -0,0 +1,102 @@
+from typing import Optional
+import numpy as np
+from app.table import year
+
+
+# dimension -> column of the flattened translation rows, and its label column
+DIMENSIONS = { "sl": ("olang", "olangLabel"),
+               "tl": ("tlang", "tlangLabel"),
+               "genre": ("genre", None),
+               "magazine": ("magazine", "magazine_label"),
+               "language_area": ("language_area", None),
+               "decade": ("pubDate", None) }
+
+
+def decade(value) -> Optional[int]:
+    y = year(value)
+    return None if y is None else y // 10 * 10
+
+
+class StatsCube():
+    """Translation counts over language pair, genre, magazine, language
+    area and decade.
+
+    The cube keeps each distinct combination of a translation and its
+    dimension values once, as one array of value codes per dimension and
+    one of translation codes. A slice masks those facts and a roll-up
+    counts the distinct translations per group, both vectorized, so
+    their cost follows the number of facts rather than of rows.
+
+    A translation has one fact per genre and per language area of its
+    issue, but it is counted once in every total and group it falls in:
+    one with two genres counts once towards each genre and once in a
+    roll-up across genres.
+    """
+    def __init__(self, rows: list[dict]) -> None:
+        self.vocab: dict[str, list] = {}
+        self.codes: dict[str, dict] = {}
+        self.labels: dict[str, dict] = {dim: {} for dim in DIMENSIONS}
+        facts = set()
+        for row in rows:
+            cell = []
+            for dim, (column, label) in DIMENSIONS.items():
+                value = decade(row.get(column)) if dim == "decade" else row.get(column)
+                cell.append(value)
+                if value is not None and label and row.get(label):
+                    self.labels[dim][value] = row[label]
+            facts.add((row.get('translation'), tuple(cell)))
+
+        for i, dim in enumerate(DIMENSIONS):
+            self.vocab[dim] = sorted({cell[i] for _, cell in facts if cell[i] is not None})
+            self.codes[dim] = {value: code for code, value in enumerate(self.vocab[dim])}
+
+        facts = list(facts)
+        translations: dict = {}
+        self.translations = np.array([translations.setdefault(t, len(translations))
+                                      for t, _ in facts], dtype=np.int32)
+        self.facts = { dim: np.array([self.codes[dim].get(cell[i], -1) for _, cell in facts],
+                                     dtype=np.int32)
+                       for i, dim in enumerate(DIMENSIONS) }
+
+    def code(self, dim: str, value) -> Optional[int]:
+        if dim == "decade":
+            try:
+                value = int(value) // 10 * 10
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"invalid decade: {value!r}") from e
+        return self.codes[dim].get(value)
+
+    def query(self, filters: Optional[dict] = None, by: tuple = ()) -> dict:
+        """The number of translations matching `filters` (dimension ->
+        value), and its breakdown over the dimensions in `by`."""
+        filters = {dim: value for dim, value in (filters or {}).items()
+                   if value and value != 'any'}
+        for dim in list(filters) + list(by):
+            if dim not in DIMENSIONS:
+                raise ValueError(f"unknown dimension {dim}")
+
+        mask = np.ones(len(self.translations), dtype=bool)
+        for dim, value in filters.items():
+            code = self.code(dim, value)
+            if code is None:
+                return { "total": 0, "groups": [] }
+            mask &= self.facts[dim] == code
+        translations = self.translations[mask]
+        result = { "total": len(np.unique(translations)), "groups": [] }
+        if not by or not len(translations):
+            return result
+
+        # each translation once per group, from its codes in the `by` dimensions
+        keys = np.unique(np.stack([self.facts[dim][mask] for dim in by] + [translations]),
+                         axis=1)
+        groups, totals = np.unique(keys[:-1], axis=1, return_counts=True)
+        for group, total in zip(groups.T.tolist(), totals.tolist()):
+            entry = {}
+            for dim, code in zip(by, group):
+                value = self.vocab[dim][code] if code >= 0 else None
+                entry[dim] = value
+                if value in self.labels[dim]:
+                    entry[f"{dim}_label"] = self.labels[dim][value]
+            entry["count"] = int(total)
+            result["groups"].append(entry)
+        return result
@@ -0,0 +1,170 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+
+# filter name -> column of the flattened translation rows
+FACET_COLUMNS = { "sl": "olang",
+                  "tl": "tlang",
+                  "genre": "genre",
+                  "magazine": "magazine",
+                  "language_area": "language_area",
+                  "pubDate": "pubDate" }
+
+
+def bits(bitmap: int) -> list[int]:
+    """The positions of the set bits of `bitmap`, in ascending order."""
+    digits = bin(bitmap)[:1:-1]
+    ids = []
+    i = digits.find('1')
+    while i != -1:
+        ids.append(i)
+        i = digits.find('1', i + 1)
+    return ids
+
+
+def year(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TranslationTable():
+    """The flattened rows of the translation query, held in memory.
+
+    Each column is a list of interned strings. The facet columns are also
+    integer-coded, with an inverted index from each code to a bitmap (a
+    Python int) of the rows carrying it, so filters are ANDs of bitmaps.
+    Orderings are built on first use and kept, so a page is a bisect and
+    a slice rather than a sort.
+    """
+    def __init__(self, rows: list[dict]) -> None:
+        self.columns: dict[str, list] = {}
+        self.vocab: dict[str, list] = {c: [] for c in FACET_COLUMNS.values()}
+        self.codes: dict[str, dict] = {c: {} for c in FACET_COLUMNS.values()}
+        self.index: dict[str, list[int]] = {c: [] for c in FACET_COLUMNS.values()}
+        self.facet_codes: dict[str, array] = {c: array('I') for c in FACET_COLUMNS.values()}
+        self._orderings: dict = {}
+
+        names = sorted({k for row in rows for k in row} - {"language_area"})
+        for name in names:
+            self.columns[name] = []
+
+        seen: dict[tuple, int] = {}
+        for row in rows:
+            values = tuple(row.get(name) for name in names)
+            i = seen.get(values)
+            if i is None:
+                i = seen[values] = len(seen)
+                for name, value in zip(names, values):
+                    self.columns[name].append(sys.intern(value) if value is not None else None)
+                for column in self.facet_codes:
+                    if column != "language_area":
+                        self.facet_codes[column].append(self._add(column, row.get(column), i))
+            # an issue may belong to several language areas
+            if row.get("language_area") is not None:
+                self._add("language_area", row["language_area"], i)
+
+        self.size = len(seen)
+        self.all = (1 << self.size) - 1
+
+    def _add(self, column: str, value, i: int) -> int:
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.vocab[column])
+            self.vocab[column].append(value)
+            self.index[column].append(0)
+        self.index[column][code] |= 1 << i
+        return code
+
+    def bitmap(self, column: str, value) -> int:
+        code = self.codes[column].get(value)
+        return 0 if code is None else self.index[column][code]
+
+    def match(self, filters: dict) -> int:
+        """A bitmap of the rows passing the translation filters."""
+        bitmap = self.all
+        for name, column in FACET_COLUMNS.items():
+            value = filters.get(name)
+            if value and value != 'any':
+                bitmap &= self.bitmap(column, value)
+
+        after = filters.get("after_date")
+        before = filters.get("before_date")
+        if (after and after != 'any') or (before and before != 'any'):
+            dates = 0
+            for code, value in enumerate(self.vocab["pubDate"]):
+                y = year(value)
+                if y is None:
+                    continue
+                if after and after != 'any' and not y > int(after):
+                    continue
+                if before and before != 'any' and not y < int(before):
+                    continue
+                dates |= self.index["pubDate"][code]
+            bitmap &= dates
+        return bitmap
+
+    def ordering(self, keys: tuple) -> tuple[list[int], list[tuple], array]:
+        """Row ids sorted on `keys`, their sort keys, and each row's rank."""
+        if keys not in self._orderings:
+            columns = []
+            for key in keys:
+                # a variable no row binds, such as ?volume, sorts as ""
+                columns.append(self.columns.get(key.lstrip('?'), [None] * self.size))
+            sortkeys = [tuple(c[i] or "" for c in columns) for i in range(self.size)]
+            order = sorted(range(self.size), key=sortkeys.__getitem__)
+            rank = array('I', bytes(4 * self.size))
+            for r, i in enumerate(order):
+                rank[i] = r
+            self._orderings[keys] = (order, [sortkeys[i] for i in order], rank)
+        return self._orderings[keys]
+
+    def row(self, i: int) -> dict:
+        return {name: column[i] for name, column in self.columns.items()
+                if column[i] is not None}
+
+    def select(self, filters: dict, keys: list[str],
+               offset: int = 0, limit: Optional[int] = None,
+               seek: Optional[list] = None) -> list[dict]:
+        order, sortkeys, rank = self.ordering(tuple(keys))
+        start = bisect_right(sortkeys, tuple(seek)) if seek else 0
+        bitmap = self.match(filters)
+        if bitmap == self.all:
+            ranks = range(start, self.size)
+        else:
+            ranked = sorted(rank[i] for i in bits(bitmap))
+            ranks = ranked[bisect_left(ranked, start):]
+        end = None if limit is None else offset + limit
+        return [self.row(order[r]) for r in ranks[offset:end]]
+
+    def count(self, filters: dict) -> int:
+        """The number of distinct translations passing the filters."""
+        translations = self.columns.get("translation", [])
+        return len({translations[i] for i in bits(self.match(filters))})
+
+    def facet_counts(self, filters: dict) -> dict[str, dict[str, int]]:
+        """For each facet filter but the dates, the number of distinct
+        translations each of its values would leave, given the other
+        filters."""
+        translations = self.columns.get("translation", [])
+        counts = {}
+        for name, column in FACET_COLUMNS.items():
+            if name == "pubDate":
+                continue
+            others = self.match({k: v for k, v in filters.items() if k != name})
+            found: dict[str, set] = {}
+            if column == "language_area":
+                for code, value in enumerate(self.vocab[column]):
+                    ids = bits(others & self.index[column][code])
+                    if ids:
+                        found[value] = {translations[i] for i in ids}
+            else:
+                vocab, codes = self.vocab[column], self.facet_codes[column]
+                for i in bits(others):
+                    found.setdefault(vocab[codes[i]], set()).add(translations[i])
+            counts[name] = {value: len(ids) for value, ids in found.items() if value is not None}
+        return counts
@@ -0,0 +1,137 @@
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from fastapi.templating import Jinja2Templates
+from app.profiler import Sampler
+
+
+# phase -> seconds for the request being handled; tasks spawned by
+# asyncio.gather copy the context, so they share the same dict
+_timings: ContextVar[Optional[dict]] = ContextVar("spatrem_timings", default=None)
+# set when the request was answered from stale results
+_stale: ContextVar[Optional[list]] = ContextVar("spatrem_stale", default=None)
+
+DESCRIPTIONS = { "sparql": "SPARQL wait",
+                 "form": "Form choices",
+                 "render": "Template render",
+                 "total": "Total" }
+
+
+def add(phase: str, seconds: float) -> None:
+    """Add `seconds` to `phase` of the current request, if it is timed."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+def mark_stale() -> None:
+    stale = _stale.get()
+    if stale is not None:
+        stale.append(True)
+
+
+def is_stale() -> bool:
+    """Whether the current request used results kept from before GraphDB
+    became unavailable."""
+    return bool(_stale.get())
+
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(phase, time.perf_counter() - start)
+
+
+def server_timing(timings: dict) -> str:
+    """A Server-Timing header value; durations are in milliseconds."""
+    metrics = []
+    for phase, seconds in timings.items():
+        desc = DESCRIPTIONS.get(phase, phase)
+        metrics.append(f'{phase};desc="{desc}";dur={seconds * 1000:.1f}')
+    return ", ".join(metrics)
+
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that count rendering as the "render" phase."""
+    def TemplateResponse(self, *args, **kwargs):
+        with timed("render"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+class ServerTiming():
+    """ASGI middleware adding a Server-Timing header to every response.
+
+    The header breaks the request into the time spent waiting on SPARQL,
+    building form choices and rendering templates, plus the total up to
+    the response headers. Queries run concurrently add up, so "sparql"
+    may exceed "total". Streamed pages are rendered after the headers are
+    sent, so their rendering is not in the header.
+
+    A response built from stale results, kept from before GraphDB became
+    unavailable, also gets a `Warning: 110` header.
+
+    A request carrying `profile_token` in the X-Spatrem-Profile header is
+    sampled while it runs and answered with the folded stacks instead of
+    the page. The token is not taken from the query string, which would
+    leave it in access logs and response cache keys. Without a token
+    configured, profiling is off.
+    """
+    def __init__(self, app, profile_token: Optional[str] = None,
+                 profile_interval: float = 0.005) -> None:
+        self.app = app
+        self.profile_token = profile_token
+        self.profile_interval = profile_interval
+
+    def profiling(self, request: Request) -> bool:
+        if not self.profile_token:
+            return False
+        token = request.headers.get("x-spatrem-profile", "")
+        return secrets.compare_digest(token.encode(), self.profile_token.encode())
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict = {}
+        reset = _timings.set(timings)
+        reset_stale = _stale.set([])
+        start = time.perf_counter()
+        try:
+            if self.profiling(Request(scope)):
+                await self.profile(scope, receive, send, timings, start)
+                return
+
+            async def send_with_timing(message) -> None:
+                if message["type"] == "http.response.start":
+                    timings["total"] = time.perf_counter() - start
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(timings))
+                    if is_stale():
+                        headers.append("Warning", '110 - "Response is Stale"')
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stale.reset(reset_stale)
+            _timings.reset(reset)
+
+    async def profile(self, scope, receive, send, timings: dict, start: float) -> None:
+        async def discard(message) -> None:
+            pass
+
+        with Sampler(self.profile_interval) as sampler:
+            await self.app(scope, receive, discard)
+        timings["total"] = time.perf_counter() - start
+        response = Response(sampler.folded(), media_type="text/plain",
+                            headers={ "Server-Timing": server_timing(timings),
+                                      "Cache-Control": "no-store" })
+        await response(scope, receive, send)
@@ -0,0 +1,144 @@
+"""Compare SPARQL result decoding paths on 1k, 10k and 100k rows.
+
+    python benchmarks/decode.py [--repeat N] [--sizes 1000 10000 100000]
+    SPARQL_ENDPOINT=... python benchmarks/decode.py --record translations.json
+    python benchmarks/decode.py --recorded translations.json
+
+By default the result sets are synthetic rows shaped like the
+translation query's. --record saves the JSON result of the translation
+extract query, and --recorded replays it, repeated or truncated to each
+size. The TSV input is encoded from the same bindings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.decode import ACCEPT, decode_json, decode_tsv, loads
+from app.kb import Kb, QueryResult
+
+
+COLUMNS = ("translation", "title", "translator", "translator_name", "author",
+           "author_name", "olangLabel", "tlangLabel", "genre", "magazine_label",
+           "issue_label", "pubDate")
+
+
+def synthetic_bindings(size: int) -> list[dict]:
+    bindings = []
+    for i in range(size):
+        binding = {}
+        for column in COLUMNS:
+            if column in ("translation", "translator", "author"):
+                binding[column] = { "type": "uri",
+                                    "value": f"http://spacesoftranslation.org/ns/{column}/{i}" }
+            else:
+                binding[column] = { "type": "literal",
+                                    "value": f"{column} {i} \u00e9" }
+        bindings.append(binding)
+    return bindings
+
+
+def tsv_term(term: dict) -> str:
+    if term["type"] == "uri":
+        return f"<{term['value']}>"
+    if term["type"] == "bnode":
+        return f"_:{term['value']}"
+    value = (term["value"].replace("\\", "\\\\").replace('"', '\\"')
+             .replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r"))
+    return f'"{value}"'
+
+
+def encode(variables: list[str], bindings: list[dict]) -> tuple[bytes, str]:
+    """The same result as SPARQL JSON and as SPARQL TSV."""
+    content = json.dumps({ "head": {"vars": variables},
+                           "results": {"bindings": bindings} }).encode()
+    lines = ["\t".join(f"?{v}" for v in variables)]
+    for binding in bindings:
+        lines.append("\t".join(tsv_term(binding[v]) if v in binding else ""
+                               for v in variables))
+    return content, "\n".join(lines) + "\n"
+
+
+def resize(bindings: list[dict], size: int) -> list[dict]:
+    return (bindings * (size // len(bindings) + 1))[:size]
+
+
+def baseline(content: bytes, text: str) -> QueryResult:
+    # the previous Kb.query: stdlib json, a second pass, a validated model
+    bindings = json.loads(content)['results']['bindings']
+    results = [{k : v['value'] for k,v in binding.items()} for binding in bindings]
+    return QueryResult(count=len(results), data=results)
+
+
+def lean_json(content: bytes, text: str) -> QueryResult:
+    rows = decode_json(content)
+    return QueryResult.model_construct(count=len(rows), data=rows)
+
+
+def lean_tsv(content: bytes, text: str) -> QueryResult:
+    rows = decode_tsv(text)
+    return QueryResult.model_construct(count=len(rows), data=rows)
+
+
+PATHS = { "baseline": baseline,
+          f"json ({loads.__module__})": lean_json,
+          "tsv": lean_tsv }
+
+
+async def record(path: Path) -> None:
+    endpoint = os.getenv("SPARQL_ENDPOINT")
+    if not endpoint:
+        sys.exit("SPARQL_ENDPOINT not set")
+    kb = Kb(endpoint)
+    query = kb.construct_translation_extract_query()
+    response = await kb.client.post(endpoint, data={"query": query},
+                                    headers={"Accept": ACCEPT["json"]})
+    response.raise_for_status()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(response.content)
+    await kb.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--record", type=Path, metavar="FILE")
+    parser.add_argument("--recorded", type=Path, metavar="FILE")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record))
+        return
+
+    if args.recorded:
+        recorded = json.loads(args.recorded.read_bytes())
+        variables = recorded["head"]["vars"]
+        bindings = recorded["results"]["bindings"]
+    else:
+        variables = list(COLUMNS)
+        bindings = synthetic_bindings(max(args.sizes))
+
+    print(f"{'rows':>8} {'path':24} {'median ms':>10} {'min ms':>8} {'MB':>6}")
+    for size in args.sizes:
+        content, text = encode(variables, resize(bindings, size))
+        expected = baseline(content, text).data
+        for label, path in PATHS.items():
+            assert path(content, text).data == expected, label
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                path(content, text)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{size:8} {label:24} {statistics.median(timings):10.1f} "
+                  f"{min(timings):8.1f} {len(content) / 1e6:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
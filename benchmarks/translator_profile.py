@@ -0,0 +1,64 @@
+"""Time the translator profile query against a live endpoint.
+
+    SPARQL_ENDPOINT=http://localhost:7200/repositories/spatrem \
+        python benchmarks/translator_profile.py [--repeat N] [ID ...]
+
+For each translator ID (by default the first 20 translators), runs
+Kb.translator_query and Kb.translator and prints the GraphDB response
+time, the rows returned and the rows that went into the profile.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.kb import Kb
+
+
+async def sample_ids(kb: Kb, count: int) -> list[str]:
+    translators = await kb.translators({}, page_size=count)
+    return [t['id'].split('/')[-1] for t in translators]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ids", nargs="*", help="translator ids, e.g. Alegiani_Conte")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=20,
+                        help="number of translators to sample when no ids are given")
+    args = parser.parse_args()
+
+    endpoint = os.getenv("SPARQL_ENDPOINT")
+    if not endpoint:
+        sys.exit("SPARQL_ENDPOINT not set")
+
+    kb = Kb(endpoint)
+    ids = args.ids or await sample_ids(kb, args.sample)
+
+    print(f"{'id':40} {'rows':>6} {'works':>6} {'median ms':>10} {'max ms':>8} {'profile ms':>11}")
+    for uriref in ids:
+        query = kb.translator_query(uriref)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = await kb.query(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        works = sum(1 for row in result.data if row['part'] == 'work')
+
+        start = time.perf_counter()
+        await kb.translator(uriref)
+        profile = (time.perf_counter() - start) * 1000
+
+        print(f"{uriref:40} {result.count:6} {works:6} "
+              f"{statistics.median(timings):10.1f} {max(timings):8.1f} {profile:11.1f}")
+
+    await kb.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
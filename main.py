@@ -1,13 +1,24 @@
+import asyncio
 import os
+import secrets
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Request, Form, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.templating import _TemplateResponse
 from typing import Optional
-from app.kb import Kb, QueryResult
+from urllib.parse import urlencode
+from app.kb import Kb, QueryResult, FacetCache, started
+from app.breaker import CircuitBreaker, EndpointUnavailable
 from app.forms import TranslationForm, TranslatorForm
+from app.export import TRANSLATION_COLUMNS, TRANSLATOR_COLUMNS, MEDIA_TYPES, export_chunks
+from app.httpcache import ResponseCache
+from app.responses import FastJSONResponse
+from app.search import NameIndex
+from app.metrics import QueryMetrics
+from app.timing import ServerTiming, TimedTemplates, timed, is_stale
 
 class SpatremError(Exception):
     """Spatrem error of some kind"""
@@ -30,11 +41,221 @@ static_root_absolute = project_root_absolute / "static"
 template_root_absolute = project_root_absolute / "templates"
 
 
-kb = Kb(endpoint)
+facet_cache = FacetCache(ttl=float(os.getenv("SPATREM_FACET_CACHE_TTL", 300)),
+                         maxsize=int(os.getenv("SPATREM_FACET_CACHE_SIZE", 128)))
 
-app: FastAPI = FastAPI()
+count_cache = FacetCache(ttl=float(os.getenv("SPATREM_FACET_CACHE_TTL", 300)),
+                         maxsize=int(os.getenv("SPATREM_COUNT_CACHE_SIZE", 1024)))
+
+kb = Kb(endpoint,
+        cache=facet_cache,
+        count_cache=count_cache,
+        timeout=float(os.getenv("SPATREM_SPARQL_TIMEOUT", 30)),
+        max_connections=int(os.getenv("SPATREM_SPARQL_CONNECTIONS", 10)),
+        max_concurrency=int(os.getenv("SPATREM_SPARQL_CONCURRENCY", 8)),
+        version_ttl=float(os.getenv("SPATREM_GRAPH_VERSION_TTL", 30)),
+        metrics=QueryMetrics(slow_ms=float(os.getenv("SPATREM_SLOW_QUERY_MS", 1000))),
+        result_format=os.getenv("SPATREM_SPARQL_FORMAT", "json"),
+        deadline=float(os.getenv("SPATREM_SPARQL_DEADLINE", 10)),
+        queue_timeout=float(os.getenv("SPATREM_QUEUE_TIMEOUT", 5)),
+        max_streams=int(os.getenv("SPATREM_SPARQL_STREAMS", 2)),
+        materialized=os.getenv("SPATREM_MATERIALIZE", "") not in ("", "0", "false"),
+        breaker=CircuitBreaker(threshold=int(os.getenv("SPATREM_BREAKER_THRESHOLD", 5)),
+                               reset_after=float(os.getenv("SPATREM_BREAKER_RESET", 30))),
+        stale_cache=FacetCache(ttl=float(os.getenv("SPATREM_STALE_TTL", 86400)),
+                               maxsize=int(os.getenv("SPATREM_STALE_CACHE_SIZE", 1024))))
+
+
+# the profiler's token also unlocks the admin endpoints
+admin_token = os.getenv("SPATREM_PROFILE_TOKEN")
+
+
+def require_admin(request: Request) -> None:
+    """Refuse a request unless it carries `admin_token` in the
+    X-Spatrem-Admin header; without a token configured, the admin
+    endpoints are off."""
+    token = request.headers.get("x-spatrem-admin", "")
+    if not admin_token or not secrets.compare_digest(token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+warmup_retry = float(os.getenv("SPATREM_WARMUP_RETRY", 5))
+
+
+# the most rows a page may ask for
+max_page_size = int(os.getenv("SPATREM_MAX_PAGE_SIZE", 1000))
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Open the GraphDB connections, fetch the form vocabularies and the
+    unfiltered count, build the translation table if materialized, the
+    search and name indexes and the stats cube, and compile every
+    template, retrying until GraphDB answers; /readyz reports ready
+    afterwards."""
+    while True:
+        try:
+            await kb.open_connections()
+            await asyncio.gather(kb.facets(), kb.count_translations())
+            await kb.translation_table()
+            await asyncio.gather(kb.search_index(), kb.name_index(), kb.stats_cube())
+            break
+        except Exception as e:
+            app.state.warmup_error = repr(e)
+            await asyncio.sleep(warmup_retry)
+
+    for env in (templates.env, stream_templates.env):
+        for name in env.list_templates(extensions=["html"]):
+            env.get_template(name)
+
+    app.state.warmup_error = None
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warmup_error = None
+    warmup = asyncio.create_task(warm_up(app))
+    yield
+    warmup.cancel()
+    await kb.aclose()
+
+
+app: FastAPI = FastAPI(lifespan=lifespan)
 app.mount("/static",  StaticFiles(directory=str(static_root_absolute)), name="static")
-templates: Jinja2Templates = Jinja2Templates(directory=template_root_absolute)
+app.add_middleware(ResponseCache,
+                   kb=kb,
+                   prefixes=("/magazines", "/issues/", "/authors/", "/api/"),
+                   exclude=("/api/cache", "/api/translations/export", "/api/translators/export"),
+                   maxsize=int(os.getenv("SPATREM_RESPONSE_CACHE_SIZE", 512)),
+                   max_age=int(os.getenv("SPATREM_HTTP_MAX_AGE", 60)),
+                   ttl=float(os.getenv("SPATREM_RESPONSE_CACHE_TTL", 300)))
+app.add_middleware(ServerTiming,
+                   profile_token=admin_token,
+                   profile_interval=float(os.getenv("SPATREM_PROFILE_INTERVAL_MS", 5)) / 1000)
+templates: Jinja2Templates = TimedTemplates(directory=template_root_absolute)
+# async environment for pages rendered while their rows are still arriving
+stream_templates: Jinja2Templates = Jinja2Templates(directory=template_root_absolute,
+                                                    enable_async=True)
+for env in (templates.env, stream_templates.env):
+    env.globals["stale"] = is_stale
+
+
+@app.exception_handler(EndpointUnavailable)
+async def endpoint_unavailable(request: Request, exc: EndpointUnavailable):
+    retry = max(int(kb.breaker.retry_in()), 1)
+    return JSONResponse(status_code=503,
+                        content={"detail": "The knowledge base is unavailable, please retry shortly."},
+                        headers={"Retry-After": str(retry)})
+
+async def timed_form(form_class, request: Request):
+    with timed("form"):
+        return await form_class.from_formdata(request)
+
+
+async def translation_choices() -> dict:
+    facets = await kb.facets()
+    with timed("form"):
+        form_data = {
+            "lang_choices" : [(item['lang'], item['label']) for item in facets['languages'].data],
+            "source_lang_choices" : [(item['lang'], item['label']) for item in facets['source_languages'].data],
+            "target_lang_choices" : [(item['lang'], item['label']) for item in facets['target_languages'].data],
+            "magazine_choices": [(item['magazine'], item['label']) for item in facets['magazines'].data],
+            "date_choices": [(item['date'], item['date']) for item in facets['dates'].data],
+            "genre_choices" : [(item['genre'], item['genre']) for item in facets['genres'].data],
+            "language_area_choices" : [(item['language_area'], item['language_area']) for item in facets['language_areas'].data],
+            }
+
+        for _,v in form_data.items():
+            v.insert(0, ('any', 'any'))
+
+    return form_data
+
+
+async def translator_choices() -> dict:
+    facets = await kb.facets()
+    with timed("form"):
+        form_choices = {
+            "gender_choices" : [(item['gender'], item['gender']) for item in facets['genders'].data],
+            "nationality_choices" : [(item['nationality'], item['nationality']) for item in facets['nationalities'].data],
+            "language_area_choices" : [(item['language_area'], item['language_area']) for item in facets['language_areas'].data],
+            "magazine_choices": [(item['magazine'], item['label']) for item in facets['magazines'].data],
+            "year_birth_choices": [(item['date'], item['date']) for item in facets['year_births'].data],
+            "year_death_choices": [(item['date'], item['date']) for item in facets['year_deaths'].data],
+            "genre_choices" : [(item['genre'], item['genre']) for item in facets['genres'].data],
+            "pubDate_choices": [(item['date'], item['date']) for item in facets['dates'].data],
+            "sl_choices" : [(item['lang'], item['label']) for item in facets['source_languages'].data],
+            "tl_choices" : [(item['lang'], item['label']) for item in facets['target_languages'].data],
+            }
+
+        for _,v in form_choices.items():
+            v.insert(0, ('any', 'any'))
+
+    return form_choices
+
+
+def counted(choices: list, counts: dict, selected) -> list:
+    """Dropdown `choices` labelled with how many rows each would return,
+    e.g. "poetry (132)"; those returning none are left out unless
+    selected."""
+    return [(value, label if value == 'any' else f"{label} ({counts.get(value, 0)})")
+            for value, label in choices
+            if value == 'any' or value == selected or counts.get(value)]
+
+
+async def render_translators(request: Request, form: TranslatorForm, filters: dict,
+                             page: int, page_size: int) -> StreamingResponse:
+    """Stream translators.html, rendering each translator row as it
+    arrives from GraphDB instead of after the whole page is fetched.
+
+    The first row is awaited before the response starts. If GraphDB
+    cannot stream it, or the circuit breaker is not closed, the page is
+    fetched in one query instead, which has a deadline and falls back to
+    stale results.
+    """
+    page = max(page, 1)
+    pager = { "current_page": page,
+              "prev_page": page - 1 if page > 1 else None,
+              "next_page": None,
+              "page_size": page_size,
+              "query": urlencode({k: v for k, v in filters.items() if v is not None}) }
+
+    # one row past the page tells whether there is a next page
+    offset = (page - 1) * page_size
+    limit = page_size + 1 if page_size else 0
+    try:
+        translators = kb.iter_translators(filters, offset=offset, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if kb.breaker.state != "closed":
+            raise EndpointUnavailable("circuit breaker not closed")
+        translators = await started(translators)
+    except EndpointUnavailable:
+        fetched = await kb.translator_rows(filters, offset=offset, limit=limit)
+
+        async def listed():
+            for translator in fetched:
+                yield translator
+        translators = listed()
+
+    async def rows():
+        count = 0
+        async for translator in translators:
+            count += 1
+            if page_size and count > page_size:
+                pager["next_page"] = page + 1
+            else:
+                yield translator
+
+    template = stream_templates.get_template("translators.html")
+    context = { "request" : request,
+                "form" : form,
+                "pager": pager,
+                "translators": rows() }
+    return StreamingResponse(template.generate_async(context), media_type="text/html")
+
 
 @app.get("/", response_class=HTMLResponse)
 def start(request: Request) -> _TemplateResponse:
@@ -44,7 +265,7 @@ def start(request: Request) -> _TemplateResponse:
 
 @app.get("/languages", response_class=HTMLResponse)
 async def get_languages(request: Request):
-    result: QueryResult = kb.languages()
+    result: QueryResult = await kb.languages()
     return templates.TemplateResponse("languages.html",
                                       { "request": request,
                                         "languages": result.data,
@@ -55,7 +276,7 @@ async def get_languages(request: Request):
 @app.post("/translations", response_class=HTMLResponse)
 async def post_translations(request: Request):
     form_data = await request.form()
-    form: TranslationForm = await TranslationForm.from_formdata(request)
+    form: TranslationForm = await timed_form(TranslationForm, request)
 
     filters = { "sl": form_data.get('sl'),
                 "tl": form_data.get('tl'),
@@ -67,32 +288,25 @@ async def post_translations(request: Request):
                 "sortby": form_data.get('sortby'),
                }
 
-    result: QueryResult = kb.translations(1, 10, filters)
-
-    form_data = {
-        "lang_choices" : [(item['lang'], item['label']) for item in kb.languages().data],
-        "source_lang_choices" : [(item['lang'], item['label']) for item in kb.source_languages().data],
-        "target_lang_choices" : [(item['lang'], item['label']) for item in kb.target_languages().data],
-        "magazine_choices": [(item['magazine'], item['label']) for item in kb.magazines().data],
-        "date_choices": [(item['date'], item['date']) for item in kb.dates().data],
-        "genre_choices" : [(item['genre'], item['genre']) for item in kb.genres().data],
-        "language_area_choices" : [(item['language_area'], item['language_area']) for item in kb.language_areas().data],
-        }
+    try:
+        result, total, form_data, counts = await asyncio.gather(kb.translations(1, 10, filters),
+                                                                kb.count_translations(filters),
+                                                                translation_choices(),
+                                                                kb.facet_counts("translations", filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    for _,v in form_data.items():
-        v.insert(0, ('any', 'any'))
 
-
-    form.genre.choices = form_data['genre_choices']
+    form.genre.choices = counted(form_data['genre_choices'], counts.get('genre', {}), filters['genre'])
     form.genre.data = filters['genre']
 
-    form.sl.choices = form_data['source_lang_choices']
+    form.sl.choices = counted(form_data['source_lang_choices'], counts.get('sl', {}), filters['sl'])
     form.sl.data = filters['sl']
 
-    form.tl.choices = form_data['target_lang_choices']
+    form.tl.choices = counted(form_data['target_lang_choices'], counts.get('tl', {}), filters['tl'])
     form.tl.data = filters['tl']
 
-    form .magazine.choices = form_data['magazine_choices']
+    form.magazine.choices = counted(form_data['magazine_choices'], counts.get('magazine', {}), filters['magazine'])
     form.magazine.data = filters['magazine']
 
     form.after_date.choices = form_data['date_choices']
@@ -101,30 +315,34 @@ async def post_translations(request: Request):
     form.before_date.choices = form_data['date_choices']
     form.before_date.data = filters['before_date']
 
-    form.language_area.choices = form_data['language_area_choices']
+    form.language_area.choices = counted(form_data['language_area_choices'], counts.get('language_area', {}), filters['language_area'])
     form.language_area.data = filters['language_area']
 
     form.sortby.data = filters['sortby']
 
     current_page = 1
-    next_page = 2
     prev_page = None
     page_size = 10
+    # total counts translations, the pages hold rows: the cursor says
+    # whether another page follows
+    next_page = 2 if result.cursor else None
 
     return templates.TemplateResponse("translations.html",
                                       { "request": request,
                                         "form": form,
                                         "current_page": current_page,
                                         "next_page": next_page,
+                                        "next_cursor": result.cursor,
                                         "prev_page": prev_page,
                                         "page_size": page_size,
+                                        "total": total,
                                         "translations" : result.data })
 
 
 @app.get("/translations", response_class=HTMLResponse)
 async def get_translations(request: Request,
-                           page: int = 1,
-                           page_size: int = 10,
+                           page: int = Query(1, ge=1),
+                           page_size: int = Query(10, ge=1, le=max_page_size),
                            sl: Optional[str] = 'any',
                            tl: Optional[str] = 'any',
                            language_area: Optional[str] = 'any',
@@ -133,10 +351,11 @@ async def get_translations(request: Request,
                            before_date: Optional[int | str] = 'any',
                            magazine: Optional[str] = 'any',
                            sortby: Optional[str] = '',
+                           cursor: Optional[str] = None,
                            ):
 
     form_data = await request.form()
-    form: TranslationForm = await TranslationForm.from_formdata(request)
+    form: TranslationForm = await timed_form(TranslationForm, request)
 
     filters = { "sl": sl,
                 "tl": tl,
@@ -149,33 +368,26 @@ async def get_translations(request: Request,
         }
 
     
-    result: QueryResult = kb.translations(page, page_size, filters)
-    form_data = {
-        "lang_choices" : [(item['lang'], item['label']) for item in kb.languages().data],
-        "source_lang_choices" : [(item['lang'], item['label']) for item in kb.source_languages().data],
-        "target_lang_choices" : [(item['lang'], item['label']) for item in kb.target_languages().data],
-        "magazine_choices": [(item['magazine'], item['label']) for item in kb.magazines().data],
-        "date_choices": [(item['date'], item['date']) for item in kb.dates().data],
-        "genre_choices" : [(item['genre'], item['genre']) for item in kb.genres().data],
-        "language_area_choices" : [(item['language_area'], item['language_area']) for item in kb.language_areas().data],        
-        }
+    try:
+        result, total, form_data, counts = await asyncio.gather(kb.translations(page, page_size, filters, cursor),
+                                                                kb.count_translations(filters),
+                                                                translation_choices(),
+                                                                kb.facet_counts("translations", filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    for _,v in form_data.items():
-        v.insert(0, ('any', 'any'))
 
-
-
-    form.genre.choices = form_data['genre_choices']
+    form.genre.choices = counted(form_data['genre_choices'], counts.get('genre', {}), filters['genre'])
     form.genre.data = filters['genre']
 
 
-    form.sl.choices = form_data['source_lang_choices']
+    form.sl.choices = counted(form_data['source_lang_choices'], counts.get('sl', {}), filters['sl'])
     form.sl.data = filters['sl']
 
-    form.tl.choices = form_data['target_lang_choices']
+    form.tl.choices = counted(form_data['target_lang_choices'], counts.get('tl', {}), filters['tl'])
     form.tl.data = filters['tl']
 
-    form .magazine.choices = form_data['magazine_choices']
+    form.magazine.choices = counted(form_data['magazine_choices'], counts.get('magazine', {}), filters['magazine'])
     form.magazine.data = filters['magazine']
 
     form.after_date.choices = form_data['date_choices']
@@ -184,27 +396,32 @@ async def get_translations(request: Request,
     form.before_date.choices = form_data['date_choices']
     form.before_date.data = filters['before_date']
 
-    form.language_area.choices = form_data['language_area_choices']
+    form.language_area.choices = counted(form_data['language_area_choices'], counts.get('language_area', {}), filters['language_area'])
     form.language_area.data = filters['language_area']
 
+    form.sortby.data = filters['sortby']
 
     current_page = page
     prev_page = page - 1
     if prev_page < 0:
         prev_page = None
 
-    if result.count < page_size:
-        next_page = None
-    else:
+    # total counts translations, the pages hold rows: the cursor says
+    # whether another page follows
+    if result.cursor:
         next_page = page + 1
+    else:
+        next_page = None
 
     return templates.TemplateResponse("translations.html",
                                       { "request": request,
                                         "form": form,
                                         "current_page": current_page,
                                         "next_page": next_page,
+                                        "next_cursor": result.cursor,
                                         "prev_page": prev_page,
                                         "page_size": page_size,
+                                        "total": total,
                                         "translations" : result.data })
 
 
@@ -222,39 +439,11 @@ async def get_translators(request: Request,
                           pub_before: Optional[int | str] = 'any',
                           sl: Optional[str] = 'any',
                           tl: Optional[str] = 'any',
-                          sortby: Optional[str] = ''):
-
-    form_choices = {
-        "gender_choices" : [(item['gender'], item['gender']) for item in kb.genders().data],
-        "nationality_choices" : [(item['nationality'], item['nationality']) for item in kb.nationalities().data],
-        "language_area_choices" : [(item['language_area'], item['language_area']) for item in kb.language_areas().data],
-        "magazine_choices": [(item['magazine'], item['label']) for item in kb.magazines().data],
-        "year_birth_choices": [(item['date'], item['date']) for item in kb.year_births().data],
-        "year_death_choices": [(item['date'], item['date']) for item in kb.year_deaths().data],
-        "genre_choices" : [(item['genre'], item['genre']) for item in kb.genres().data],
-        "pubDate_choices": [(item['date'], item['date']) for item in kb.dates().data],
-        "sl_choices" : [(item['lang'], item['label']) for item in kb.source_languages().data],
-        "tl_choices" : [(item['lang'], item['label']) for item in kb.target_languages().data],
-
-        }
-
-    for _,v in form_choices.items():
-        v.insert(0, ('any', 'any'))
-
-    form: TranslatorForm = await TranslatorForm.from_formdata(request)
-
-    form.gender.choices = form_choices['gender_choices']
-    form.nationality.choices = form_choices['nationality_choices']
-    form.language_area.choices = form_choices['language_area_choices']
-    form.magazine.choices = form_choices['magazine_choices']
-    form.year_birth.choices = form_choices['year_birth_choices']
-    form.year_death.choices = form_choices['year_death_choices']
-    form.genre.choices = form_choices['genre_choices']
-    form.pub_after.choices = form_choices['pubDate_choices']
-    form.pub_before.choices = form_choices['pubDate_choices']
-    form.sl.choices = form_choices['sl_choices']    
-    form.tl.choices = form_choices['tl_choices']    
+                          sortby: Optional[str] = '',
+                          page: int = Query(1, ge=1),
+                          page_size: int = Query(100, ge=1, le=max_page_size)):
 
+    form: TranslatorForm = await timed_form(TranslatorForm, request)
 
     filters = {"gender" : gender,
                "nationality" : nationality,
@@ -271,18 +460,31 @@ async def get_translators(request: Request,
     if sortby:
         filters['sortby'] = sortby
 
-    result = kb.translators(filters)
+    try:
+        form_choices, counts = await asyncio.gather(translator_choices(),
+                                                    kb.facet_counts("translators", filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    form.gender.choices = counted(form_choices['gender_choices'], counts.get('gender', {}), filters['gender'])
+    form.nationality.choices = counted(form_choices['nationality_choices'], counts.get('nationality', {}), filters['nationality'])
+    form.language_area.choices = counted(form_choices['language_area_choices'], counts.get('language_area', {}), filters['language_area'])
+    form.magazine.choices = counted(form_choices['magazine_choices'], counts.get('magazine', {}), filters['magazine'])
+    form.year_birth.choices = form_choices['year_birth_choices']
+    form.year_death.choices = form_choices['year_death_choices']
+    form.genre.choices = counted(form_choices['genre_choices'], counts.get('genre', {}), filters['genre'])
+    form.pub_after.choices = form_choices['pubDate_choices']
+    form.pub_before.choices = form_choices['pubDate_choices']
+    form.sl.choices = counted(form_choices['sl_choices'], counts.get('sl', {}), filters['sl'])
+    form.tl.choices = counted(form_choices['tl_choices'], counts.get('tl', {}), filters['tl'])
 
-    return templates.TemplateResponse("translators.html",
-                                      { "request" : request,
-                                        "form" : form,
-                                        "translators": result })
+    return await render_translators(request, form, filters, page, page_size)
 
 
 
 @app.post("/translators", response_class=HTMLResponse)
 async def post_translators(request: Request):
-    form: TranslatorForm = await TranslatorForm.from_formdata(request)
+    form: TranslatorForm = await timed_form(TranslatorForm, request)
 
     filters = {"gender" : form.gender.data,
                "nationality" : form.nationality.data,
@@ -301,62 +503,39 @@ async def post_translators(request: Request):
         filters['sortby'] = form.sortby.data
 
 
-    result:list = kb.translators(filters)
-
-    form_choices = {
-        "gender_choices" : [(item['gender'], item['gender']) for item in kb.genders().data],
-        "nationality_choices" : [(item['nationality'], item['nationality']) for item in kb.nationalities().data],
-        "language_area_choices" : [(item['language_area'], item['language_area']) for item in kb.language_areas().data],
-        "magazine_choices": [(item['magazine'], item['label']) for item in kb.magazines().data],
-        "year_birth_choices": [(item['date'], item['date']) for item in kb.year_births().data],
-        "year_death_choices": [(item['date'], item['date']) for item in kb.year_deaths().data],
-        "genre_choices" : [(item['genre'], item['genre']) for item in kb.genres().data],
-        "pubDate_choices": [(item['date'], item['date']) for item in kb.dates().data],
-        "sl_choices" : [(item['lang'], item['label']) for item in kb.source_languages().data],
-        "tl_choices" : [(item['lang'], item['label']) for item in kb.target_languages().data],
-
-        }
-
-    # form_choices = {
-    #     "gender_choices" : [(item['gender'], item['gender']) for item in kb.genders().data],
-    #     "nationality_choices" : [(item['nationality'], item['nationality']) for item in kb.nationalities().data],
-    #     "language_area_choices" : [(item['language_area'], item['language_area']) for item in kb.language_areas().data],
-    #     "magazine_choices": [(item['magazine'], item['label']) for item in kb.magazines().data],
-    #     }
-
-    for _,v in form_choices.items():
-        v.insert(0, ('any', 'any'))
+    try:
+        form_choices, counts = await asyncio.gather(translator_choices(),
+                                                    kb.facet_counts("translators", filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # form.gender.choices = form_choices['gender_choices']
     # form.nationality.choices = form_choices['nationality_choices']
     # form.language_area.choices = form_choices['language_area_choices']
     # form.magazine.choices = form_choices['magazine_choices']
 
-    form.gender.choices = form_choices['gender_choices']
-    form.nationality.choices = form_choices['nationality_choices']
-    form.language_area.choices = form_choices['language_area_choices']
-    form.magazine.choices = form_choices['magazine_choices']
+    form.gender.choices = counted(form_choices['gender_choices'], counts.get('gender', {}), filters['gender'])
+    form.nationality.choices = counted(form_choices['nationality_choices'], counts.get('nationality', {}), filters['nationality'])
+    form.language_area.choices = counted(form_choices['language_area_choices'], counts.get('language_area', {}), filters['language_area'])
+    form.magazine.choices = counted(form_choices['magazine_choices'], counts.get('magazine', {}), filters['magazine'])
     form.year_birth.choices = form_choices['year_birth_choices']
     form.year_death.choices = form_choices['year_death_choices']
-    form.genre.choices = form_choices['genre_choices']
+    form.genre.choices = counted(form_choices['genre_choices'], counts.get('genre', {}), filters['genre'])
     form.pub_after.choices = form_choices['pubDate_choices']
     form.pub_before.choices = form_choices['pubDate_choices']
-    form.sl.choices = form_choices['sl_choices']    
-    form.tl.choices = form_choices['tl_choices']    
+    form.sl.choices = counted(form_choices['sl_choices'], counts.get('sl', {}), filters['sl'])
+    form.tl.choices = counted(form_choices['tl_choices'], counts.get('tl', {}), filters['tl'])
 
     
 
-    return templates.TemplateResponse("translators.html",
-                                      { "request" : request,
-                                        "form" : form,
-                                        "translators": result })
+    return await render_translators(request, form, filters, 1, 100)
 
 
 
 @app.get("/translators/{id}", response_class=HTMLResponse)
-def get_translator(request: Request, id:str):
+async def get_translator(request: Request, id:str):
 
-    result = kb.translator(id)
+    result = await kb.translator(id)
     return templates.TemplateResponse("translator.html",
                                       { "request": request,
                                         "info": result,
@@ -378,14 +557,14 @@ def get_translator(request: Request, id:str):
 
 @app.get("/magazines", response_class=HTMLResponse)
 async def get_magazines(request: Request):
-    result: QueryResult = kb.magazines()
+    result: QueryResult = await kb.magazines()
     return templates.TemplateResponse("magazines.html",
                                       { "request": request,
                                         "magazines": result.data })
 
 @app.get("/magazines/{key}", response_class=HTMLResponse)
 async def get_magazine_by_key(request: Request, key:str):
-    result: dict = kb.magazine(key)
+    result: dict = await kb.magazine(key)
     return templates.TemplateResponse("magazine.html",
                                       {
                                           "request": request,
@@ -395,7 +574,7 @@ async def get_magazine_by_key(request: Request, key:str):
 
 @app.get("/issues/{key}", response_class=HTMLResponse)
 async def get_issue_by_key(request: Request, key):
-    result = kb.issue(key)
+    result = await kb.issue(key)
     return templates.TemplateResponse("issue.html", { "request": request,
                                                       "info": result['info'],
                                                       "constituents": result['constituents']})
@@ -403,54 +582,236 @@ async def get_issue_by_key(request: Request, key):
 
 @app.get("/authors/{key}", response_class=HTMLResponse)
 async def get_author_by_key(request: Request, key):
-    result = kb.author(key)
+    result = await kb.author(key)
     return templates.TemplateResponse("author.html", { "request": request,
                                                            "data" :result.data})
 
 
+@app.get("/search", response_class=HTMLResponse)
+async def get_search(request: Request, q: str = "", limit: int = 50):
+    index = await kb.search_index()
+    return templates.TemplateResponse("search.html", { "request": request,
+                                                       "q": q,
+                                                       "hits": index.search(q, limit) })
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    if not request.app.state.ready:
+        return JSONResponse(status_code=503,
+                            content={"status": "warming up",
+                                     "error": request.app.state.warmup_error})
+    return {"status": "ready"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    lines = [kb.metrics.render()]
+    lines += ["# HELP spatrem_cache_requests_total Cache lookups, by cache and outcome.",
+              "# TYPE spatrem_cache_requests_total counter"]
+    for name, cache in (("facets", kb.facet_cache), ("counts", kb.count_cache)):
+        lines.append(f'spatrem_cache_requests_total{{cache="{name}",result="hit"}} {cache.hits}')
+        lines.append(f'spatrem_cache_requests_total{{cache="{name}",result="miss"}} {cache.misses}')
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api") 
 async def get_api():
     return "<p>this is the api<p>"
 
 @app.get("/api/languages")
 async def api_get_languages():
-    return kb.languages()
+    return FastJSONResponse(await kb.languages())
+
+@app.get("/api/facets")
+async def api_get_facets():
+    return FastJSONResponse(await kb.facets())
 
 @app.get("/api/pubDates")
 async def api_get_pubDates():
-    return kb.dates()
+    return FastJSONResponse(await kb.dates())
 
 @app.get("/api/magazines")
 async def api_get_magazines():
-    return kb.magazines()
+    return FastJSONResponse(await kb.magazines())
 
 @app.get("/api/magazines/{key}")
 async def api_get_magazine(key):
-    return kb.magazine(key)
+    return FastJSONResponse(await kb.magazine(key))
+
+@app.get("/api/magazines/{key}/contents")
+async def api_get_magazine_contents(key):
+    contents = await kb.magazine_contents(key)
+    if contents is None:
+        raise HTTPException(status_code=404, detail=f"no magazine {key}")
+    return FastJSONResponse(contents)
 
 @app.get("/api/issues/{magkey}")
 async def api_get_issues(magkey):
-    return kb.issues(magkey)
+    return FastJSONResponse(await kb.issues(magkey))
 
 @app.get("/api/constituents/{issuekey}")
 async def api_get_constituents(issuekey):
-    return kb.constituents(issuekey)
+    return FastJSONResponse(await kb.constituents(issuekey))
 
 @app.get("/api/constituent/{conkey}")
 async def api_get_constituent(conkey):
-    return kb.constituent(conkey)
+    return FastJSONResponse(await kb.constituent(conkey))
 
 @app.head("/api/translations")
 async def api_get_translations_count():
-    translations: QueryResult  = kb.translations(page=0, page_size=0)
-    content = {"count": translations.count}
-    headers = {"X-result-count": str(translations.count), "Content-Language": "en-US"}
+    count: int = await kb.count_translations()
+    content = {"count": count}
+    headers = {"X-result-count": str(count), "Content-Language": "en-US"}
     return JSONResponse(content=content, headers=headers)
 
 @app.get("/api/translations")
-async def api_get_translations() -> QueryResult:
-    return kb.translations(page=0, page_size=20)
+async def api_get_translations(page: int = Query(1, ge=1),
+                               page_size: int = Query(20, ge=1, le=max_page_size),
+                               cursor: Optional[str] = None) -> QueryResult:
+    try:
+        result = await kb.translations(page=page, page_size=page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(result)
+
+async def export_response(rows, format: str, columns: tuple, filename: str) -> StreamingResponse:
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"unknown export format {format}")
+    # fail with a 503 rather than a truncated file if GraphDB is down
+    rows = await started(rows)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    return StreamingResponse(export_chunks(rows, format, columns),
+                             media_type=MEDIA_TYPES[format], headers=headers)
+
+@app.get("/api/translations/facets")
+async def api_translation_facets(sl: Optional[str] = 'any',
+                                 tl: Optional[str] = 'any',
+                                 language_area: Optional[str] = 'any',
+                                 genre: Optional[str] = 'any',
+                                 after_date: Optional[int | str] = 'any',
+                                 before_date: Optional[int | str] = 'any',
+                                 magazine: Optional[str] = 'any'):
+    filters = { "sl": sl,
+                "tl": tl,
+                "genre": genre,
+                "after_date": after_date,
+                "before_date": before_date,
+                "magazine": magazine,
+                "language_area": language_area }
+    try:
+        return FastJSONResponse(await kb.facet_counts("translations", filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/translations/export")
+async def api_export_translations(format: str = "csv",
+                                  sl: Optional[str] = 'any',
+                                  tl: Optional[str] = 'any',
+                                  language_area: Optional[str] = 'any',
+                                  genre: Optional[str] = 'any',
+                                  after_date: Optional[int | str] = 'any',
+                                  before_date: Optional[int | str] = 'any',
+                                  magazine: Optional[str] = 'any',
+                                  sortby: Optional[str] = ''):
+    filters = { "sl": sl,
+                "tl": tl,
+                "genre": genre,
+                "after_date": after_date,
+                "before_date": before_date,
+                "magazine": magazine,
+                "language_area": language_area,
+                "sortby": sortby }
+    try:
+        rows = kb.iter_translations(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await export_response(rows, format, TRANSLATION_COLUMNS, "translations")
+
+@app.get("/api/translators/export")
+async def api_export_translators(format: str = "csv",
+                                 gender: Optional[str] = 'any',
+                                 nationality: Optional[str] = 'any',
+                                 language_area: Optional[str] = 'any',
+                                 magazine: Optional[str] = 'any',
+                                 year_birth: Optional[str] = 'any',
+                                 year_death: Optional[str] = 'any',
+                                 genre: Optional[str] = 'any',
+                                 pub_after: Optional[int | str] = 'any',
+                                 pub_before: Optional[int | str] = 'any',
+                                 sl: Optional[str] = 'any',
+                                 tl: Optional[str] = 'any',
+                                 sortby: Optional[str] = ''):
+    filters = {"gender" : gender,
+               "nationality" : nationality,
+               "language_area" : language_area,
+               "magazine": magazine,
+               "year_birth": year_birth,
+               "year_death": year_death,
+               "pub_after": pub_after,
+               "pub_before": pub_before,
+               "sl": sl,
+               "tl": tl,
+               "genre": genre,
+               }
+    if sortby:
+        filters['sortby'] = sortby
+    try:
+        rows = kb.iter_translators(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await export_response(rows, format, TRANSLATOR_COLUMNS, "translators")
+
+@app.post("/api/translations/materialize", dependencies=[Depends(require_admin)])
+async def api_materialize_translations():
+    table = await kb.materialize()
+    return {"rows": table.size}
 
 @app.get("/api/authors/{key}")
 async def api_get_author_by_key(key):
-    return kb.author(key)
+    return FastJSONResponse(await kb.author(key))
+
+@app.get("/api/search")
+async def api_search(q: str, limit: int = 20, kind: Optional[str] = None):
+    index = await kb.search_index()
+    return FastJSONResponse(index.search(q, max(1, min(limit, 100)), kind))
+
+@app.get("/api/autocomplete")
+async def api_autocomplete(q: str, kind: str = "translator", limit: int = 10):
+    if kind not in NameIndex.KINDS:
+        raise HTTPException(status_code=400, detail=f"unknown kind {kind}")
+    index = await kb.name_index()
+    return FastJSONResponse(index.lookup(q, kind, max(1, min(limit, 100))))
+
+@app.get("/api/stats")
+async def api_stats(by: str = "",
+                    sl: Optional[str] = None,
+                    tl: Optional[str] = None,
+                    genre: Optional[str] = None,
+                    magazine: Optional[str] = None,
+                    language_area: Optional[str] = None,
+                    decade: Optional[str] = None):
+    cube = await kb.stats_cube()
+    filters = { "sl": sl, "tl": tl, "genre": genre, "magazine": magazine,
+                "language_area": language_area, "decade": decade }
+    try:
+        return FastJSONResponse(cube.query(filters, tuple(d for d in by.split(",") if d)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/cache")
+async def api_get_cache_stats():
+    return { "facets": kb.facet_cache.stats(),
+             "counts": kb.count_cache.stats(),
+             "stale": kb.stale_cache.stats(),
+             "breaker": kb.breaker.stats(),
+             "templates": kb.template_stats() }
+
+@app.post("/api/cache/purge", dependencies=[Depends(require_admin)])
+async def api_purge_cache():
+    return {"purged": kb.purge()}
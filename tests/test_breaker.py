@@ -0,0 +1,187 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.breaker import CircuitBreaker, QueueTimeout
+from app.kb import Kb
+
+
+def half_open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.threshold):
+        breaker.failure()
+    breaker.opened_at = time.monotonic() - breaker.reset_after
+    assert breaker.state == "half-open"
+
+
+RESET = 0.05
+
+
+def stuck(breaker: CircuitBreaker) -> bool:
+    """Whether the breaker stays open past `reset_after`."""
+    time.sleep(breaker.reset_after * 1.5)
+    return breaker.state == "open"
+
+
+def kb_answering(handler) -> Kb:
+    kb = Kb("http://kb.invalid", breaker=CircuitBreaker(threshold=1, reset_after=RESET))
+    kb._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    kb._stream_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return kb
+
+
+def csv_rows(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, text="x\r\n" + "".join(f"{i}\r\n" for i in range(100)))
+
+
+def test_abandoned_trial_reopens_instead_of_sticking():
+    breaker = CircuitBreaker(threshold=1, reset_after=RESET)
+    half_open(breaker)
+    assert breaker.allow()
+    assert stuck(breaker)
+    breaker.abandon()
+    assert not stuck(breaker)
+
+
+def test_abandon_outside_a_trial_changes_nothing():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.abandon()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_stream_left_during_trial_releases_the_breaker():
+    kb = kb_answering(csv_rows)
+    half_open(kb.breaker)
+
+    async def read_one():
+        rows = kb.stream("select * where { ?s ?p ?o }")
+        async for row in rows:
+            break
+        await rows.aclose()
+
+    asyncio.run(read_one())
+    assert not stuck(kb.breaker)
+
+
+def test_stream_read_to_the_end_closes_the_breaker():
+    kb = kb_answering(csv_rows)
+    half_open(kb.breaker)
+
+    async def read_all():
+        return [row async for row in kb.stream("select * where { ?s ?p ?o }")]
+
+    assert len(asyncio.run(read_all())) == 100
+    assert kb.breaker.state == "closed"
+
+
+def test_fetch_failing_to_decode_during_trial_releases_the_breaker():
+    kb = kb_answering(lambda request: httpx.Response(200, content=b"not gzip",
+                                                     headers={"Content-Encoding": "gzip"}))
+    half_open(kb.breaker)
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(kb.fetch("select * where { ?s ?p ?o }"))
+    assert not stuck(kb.breaker)
+
+
+def test_fetch_cancelled_during_trial_releases_the_breaker():
+    async def stall(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(60)
+
+    kb = kb_answering(stall)
+    half_open(kb.breaker)
+
+    async def cancel():
+        task = asyncio.ensure_future(kb.fetch("select * where { ?s ?p ?o }"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert not stuck(kb.breaker)
+
+
+def test_waiting_for_a_query_slot_does_not_trip_the_breaker():
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={"head": {"vars": []}, "results": {"bindings": []}})
+
+    kb = Kb("http://kb.invalid", max_concurrency=1, queue_timeout=0.05,
+            breaker=CircuitBreaker(threshold=1))
+    kb._client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+
+    async def two_at_once():
+        return await asyncio.gather(kb.fetch("select * where { ?s ?p ?o }"),
+                                    kb.fetch("select * where { ?s ?o ?p }"),
+                                    return_exceptions=True)
+
+    first, second = asyncio.run(two_at_once())
+    assert first.count == 0
+    assert isinstance(second, QueueTimeout)
+    assert kb.breaker.state == "closed"
+
+
+def test_open_streams_leave_the_query_slots_free():
+    def answer(request: httpx.Request) -> httpx.Response:
+        if request.headers["accept"] == "text/csv":
+            return csv_rows(request)
+        return httpx.Response(200, json={"head": {"vars": []}, "results": {"bindings": []}})
+
+    kb = kb_answering(answer)
+    kb.queue_timeout = 0.05
+    kb._limiter = asyncio.Semaphore(1)
+    kb._streams = asyncio.Semaphore(1)
+
+    async def stream_while_querying():
+        held = kb.stream("select * where { ?s ?p ?o }")
+        await held.__anext__()
+        result = await kb.fetch("select * where { ?s ?p ?o }")
+        with pytest.raises(QueueTimeout):
+            await kb.stream("select * where { ?s ?o ?p }").__anext__()
+        await held.aclose()
+        return result
+
+    assert asyncio.run(stream_while_querying()).count == 0
+    assert kb.breaker.state == "closed"
+
+
+def test_failed_version_probe_counts_and_is_not_repeated():
+    probes = []
+
+    def down(request):
+        probes.append(request.url.path)
+        return httpx.Response(503)
+
+    kb = kb_answering(down)
+    kb.breaker.threshold = 2
+
+    async def probe_twice():
+        return [await kb.graph_version(), await kb.graph_version()]
+
+    assert asyncio.run(probe_twice()) == [None, None]
+    assert probes == ["/size"]
+    assert kb.breaker.failures == 1
+
+
+def test_version_probe_is_held_to_the_deadline():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, text="42")
+
+    kb = kb_answering(slow)
+    kb.deadline = 0.05
+    start = time.monotonic()
+    assert asyncio.run(kb.graph_version()) is None
+    assert time.monotonic() - start < 0.5
+    assert kb.breaker.state == "open"
+
+
+def test_aclose_stops_the_background_refresh():
+    kb = kb_answering(lambda request: httpx.Response(503))
+
+    async def close_while_refreshing():
+        kb.revalidate("select * where { ?s ?p ?o }", "query")
+        refresh = kb._refresh
+        await kb.aclose()
+        return refresh.cancelled()
+
+    assert asyncio.run(close_while_refreshing())
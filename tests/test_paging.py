@@ -0,0 +1,120 @@
+import asyncio
+from rdflib import BNode, Graph, Literal, Namespace, RDFS
+from app.kb import Kb, QueryResult
+from app.table import TranslationTable
+
+CRM = Namespace("http://www.cidoc-crm.org/cidoc-crm/")
+LRM = Namespace("http://iflastandards.info/ns/lrm/lrmer/")
+DC = Namespace("http://purl.org/dc/terms/")
+SP = Namespace("http://spacesoftranslation.org/ns/spatrem/")
+P = Namespace("http://spacesoftranslation.org/ns/people/")
+
+
+def translations_graph() -> Graph:
+    """Three translations with two genres each, over two issues, one of
+    them without a volume."""
+    g = Graph()
+    for code, label in (("de", "German"), ("it", "Italian")):
+        g.add((SP["lang_" + code], RDFS.label, Literal(label)))
+    for person in ("a", "t"):
+        g.add((P[person], RDFS.label, Literal(f"Person {person}")))
+    mag = SP.mag0
+    g.add((mag, RDFS.label, Literal("Magazine 0")))
+    g.add((mag, DC.identifier, Literal("M0")))
+    for k in range(2):
+        issue = SP[f"iss{k}"]
+        g.add((issue, SP.pubDate, Literal("1950")))
+        g.add((issue, SP.number, Literal(str(k + 1))))
+        if k:
+            g.add((issue, SP.volume, Literal("2")))
+        g.add((issue, RDFS.label, Literal(f"Issue {k}")))
+        g.add((issue, DC.identifier, Literal(f"M0_{k}")))
+        g.add((issue, LRM.R67i_is_part_of, mag))
+        g.add((issue, SP.language_area, Literal("German")))
+    for n in range(3):
+        t, o = SP[f"t{n}"], SP[f"o{n}"]
+        g.add((o, LRM.R68_is_inspiration_for, t))
+        for node, who, lang in ((o, P.a, SP.lang_de), (t, P.t, SP.lang_it)):
+            creation, expression = BNode(), BNode()
+            g.add((node, LRM.R16i_was_created_by, creation))
+            g.add((creation, CRM.P14_carried_out_by, who))
+            g.add((node, LRM.R3i_is_realised_by, expression))
+            g.add((expression, CRM.P72_has_language, lang))
+        for genre in ("poetry", "prose"):
+            g.add((t, SP.genre, Literal(genre)))
+        title = BNode()
+        g.add((t, CRM.P1_is_identified_by, title))
+        g.add((title, LRM.R33_has_string, Literal("Same title")))
+        g.add((t, LRM.R67i_is_part_of, SP[f"iss{n % 2}"]))
+    return g
+
+
+class GraphKb(Kb):
+    """A Kb answering its queries from an in-memory rdflib graph."""
+    def __init__(self, graph: Graph) -> None:
+        super().__init__("http://kb.invalid")
+        self.graph = graph
+        self.version = "1"
+
+    async def statement_count(self):
+        return self.version
+
+    async def query(self, querystring, timeout=None, name="query", deadline=None):
+        rows = [{k: str(v) for k, v in row.asdict().items()}
+                for row in self.graph.query(querystring)]
+        return QueryResult.model_construct(count=len(rows), data=rows)
+
+
+def row_key(row: dict) -> tuple:
+    return (row['translation'], row['genre'], row['issue'])
+
+
+async def every_page(kb: Kb, page_size: int, kwargs: dict) -> list[tuple]:
+    rows, cursor = [], None
+    while True:
+        result = await kb.translations(1, page_size, kwargs, cursor)
+        # the cursor is only set when another page follows
+        assert result.data
+        rows += [row_key(row) for row in result.data]
+        cursor = result.cursor
+        if not cursor:
+            return rows
+
+
+def check_cursor_paging(kb: Kb) -> None:
+    for kwargs in ({}, {"sortby": "?title"}):
+        everything = asyncio.run(kb.translations(1, 0, kwargs)).data
+        assert len(everything) == 6
+        for page_size in (1, 2, 3, 4):
+            rows = asyncio.run(every_page(kb, page_size, kwargs))
+            assert sorted(rows) == sorted(row_key(row) for row in everything)
+
+
+def test_cursor_paging_returns_rows_tied_on_translation():
+    check_cursor_paging(GraphKb(translations_graph()))
+
+
+def test_table_cursor_paging_returns_rows_tied_on_translation():
+    kb = GraphKb(translations_graph())
+    asyncio.run(kb.materialize())
+    check_cursor_paging(kb)
+
+
+def test_materialized_table_follows_the_graph_version():
+    graph = translations_graph()
+    kb = GraphKb(graph)
+    asyncio.run(kb.materialize())
+    graph.remove((SP.t2, None, None))
+    assert asyncio.run(kb.count_translations()) == 3
+    kb.version = "2"
+    assert asyncio.run(kb.count_translations()) == 2
+
+
+def test_purge_rebuilds_the_materialized_table():
+    graph = translations_graph()
+    kb = GraphKb(graph)
+    asyncio.run(kb.materialize())
+    graph.remove((SP.t2, None, None))
+    assert asyncio.run(kb.count_translations()) == 3
+    kb.purge()
+    assert asyncio.run(kb.count_translations()) == 2
@@ -0,0 +1,9 @@
+from app.search import SearchIndex
+
+
+def test_same_title_in_one_issue_stays_two_hits():
+    rows = [{ "translation": f"t{n}", "title": "Same title", "issue_id": "M0_1",
+              "issue_label": "Issue 1", "genre": genre }
+            for n in (0, 2) for genre in ("poetry", "prose")]
+    hits = SearchIndex(rows, []).search("same title", kind="translation")
+    assert len(hits) == 2
@@ -0,0 +1,27 @@
+from app.stats import StatsCube
+
+
+def rows() -> list[dict]:
+    """Three translations with two genres each, one of them in an issue
+    of two language areas."""
+    return [{ "translation": f"t{n}", "genre": genre, "olang": "de", "tlang": "it",
+              "magazine": "m0", "pubDate": "1950", "language_area": area }
+            for n in range(3)
+            for genre in ("poetry", "prose")
+            for area in (("German", "Italian") if n == 0 else ("German",))]
+
+
+def test_totals_count_translations_not_cells():
+    cube = StatsCube(rows())
+    assert cube.query()["total"] == 3
+    assert cube.query({"language_area": "Italian"})["total"] == 1
+
+
+def test_groups_count_each_translation_once():
+    cube = StatsCube(rows())
+    assert {g["genre"]: g["count"] for g in cube.query(by=("genre",))["groups"]} == \
+        {"poetry": 3, "prose": 3}
+    assert {g["language_area"]: g["count"]
+            for g in cube.query({"genre": "poetry"}, by=("language_area",))["groups"]} == \
+        {"German": 3, "Italian": 1}
+    assert [g["count"] for g in cube.query(by=("sl", "decade"))["groups"]] == [3]